@@ -8,6 +8,50 @@ Date: 02/2022 - 05/22
 import pandas as pd
 import numpy as np
 
+# Created functions
+from ingest import read_extract
+from time_after_surgery import admissiontable, hours_after_admission
+
+# SIRS criteria
+# normal values per age group, Age is the upper limit of the age group in days
+# columns: Age, Heartrate lower, Heartrate upper, Resprate, Leuko lower, 
+# Leuko upper, SBP
+normval = np.array([[7, 100, 180, 50, 0, 34, 59],
+                    [31, 100, 180, 40, 5, 19.5, 79],
+                    [730, 90, 180, 34, 5, 17.5, 75],
+                    [1825, 0, 140, 22, 6, 15.5, 74],
+                    [4380, 0, 130, 18, 4.5, 13.5, 83],
+                    [6570, 0, 110, 14, 4.5, 11, 90]])
+
+def patient_age(patient_information):
+    """
+    Function to calculate the age of patients at admission to the PICU.
+
+    Parameters
+    ----------
+    patient_information : DataFrame containing patient information
+
+    Returns
+    -------
+    age : Series containing age (timedelta) with patient ID as index, NaT if 
+        date of birth is unknown
+
+    """
+    # Date of admission per patient (time_after_surgery.py)
+    admission = admissiontable(patient_information)
+    
+    # Date of birth per patient
+    birthdate = read_extract('birthdate.csv', 'birthdate')
+    birthdate = birthdate.drop_duplicates('Patient ID')
+    birthdate = birthdate.set_index('Patient ID')['Birthdate']
+    # To datetime format
+    birthdate = pd.to_datetime(birthdate, format = '%Y-%m-%d %H:%M:%S.%f')
+    
+    age = admission - birthdate.reindex(admission.index)
+    
+    return age
+
+
 def sirs_table(medianvitals, lab_hematologie, patient_information):
     """
     Function to create DataFrame with per patient values for the parameters
@@ -29,88 +73,81 @@ def sirs_table(medianvitals, lab_hematologie, patient_information):
     """
     vital = medianvitals[['Patient ID', 'Min', 'HR', 'RR', 'Temp rect']]    
     leuko = lab_hematologie.loc[lab_hematologie['Measurement'] == 'Leukocyten']
-    leuko = leuko.loc[leuko['Difference'] < 24]
+    # Exact hours after admission instead of float32 'Difference' for the
+    # boundaries of the 10-minute windows
+    hours = hours_after_admission(leuko)
+    leuko, hours = leuko.loc[hours < 24], hours[hours < 24]
     
     # To find patients with both vital signs and leukocyten
-    # all patients with leukos
-    ptidunique = leuko['Patient ID'].unique()
     # all vital signs of patients with leukos
-    sirsparam = vital.loc[vital['Patient ID'].isin(ptidunique)] 
-    
-    # Unique patients
-    ptidunique = pd.DataFrame(ptidunique, columns=['Patient ID'])
-    ptidunique = ptidunique.loc[ptidunique['Patient ID'].isin(sirsparam['Patient ID'])]
-
-    
-    # Add leuko to vitals
-    sirsparam['Leuko'] = '' 
+    sirsparam = vital.loc[vital['Patient ID'].isin(leuko['Patient ID'])] 
     sirsparam.reset_index(drop=True, inplace=True)
     
-    # Add date of birth to DataFrame
-    birthdate = pd.read_csv('birthdate.csv', sep=';', names = ['Patient ID',
-                                                               'Birthdate'],
-                            index_col=False)
-    birthdate = birthdate.loc[birthdate['Patient ID'].isin(ptidunique['Patient ID'])]
-    birthdate = birthdate.sort_values(['Patient ID'], ascending = True)
-    birthdate.reset_index(drop=True, inplace=True)
-    # To datetime format
-    birthdate['Birthdate'] = pd.to_datetime(birthdate['Birthdate'],
-                                            format = '%Y-%m-%d %H:%M:%S.%f')
-
-    
-    # Add date of admission to DataFrame
-    adm = patient_information.loc[patient_information['Patient ID'].isin(ptidunique['Patient ID'])] #admission date of patients in ptunique
-    adm = adm[['Patient ID', 'Admissiondate']]
-    adm = adm.sort_values(['Patient ID'], ascending = True)
-    adm.reset_index(drop=True, inplace=True)
-    # To datetime format
-    adm['Admissiondate'] = pd.to_datetime(adm['Admissiondate'],
-                                          format = '%Y-%m-%d %H:%M:%S.%f')
-
-       
-    # Calculate age of patients in days
-    age = pd.DataFrame(ptidunique, columns=['Patient ID'])
-    age['Age'] =  adm['Admissiondate'] - birthdate['Birthdate']
-    sirsparam['Age'] = ''
-    
-    # Add age of patient to sirsparam
-    # For every patient
-    for ptid in ptidunique['Patient ID']:
-        # get index where patient is in DataFrame
-        idx = sirsparam.index[sirsparam['Patient ID'] == ptid]
-        age1 = age.loc[age['Patient ID'] == ptid]
-        age2 = age1['Age']
-        age2.reset_index(drop=True, inplace=True)
-        age2 = age2.to_frame()
-        start = idx[0]
-        end = idx[-1]
-        # Add age of patient to every row of specific patient
-        sirsparam['Age'][start:end] = age2['Age'][0]
-        
-    # Add leuko to DataFrame, based on time of measurement
-    leuko.reset_index(drop=True, inplace=True)
-    leuko['Difference'] = leuko['Difference']*60 # to minutes
-    ptidunique = leuko['Patient ID'].unique()
-    
-    # for every patient
-    for ptid in ptidunique:
-        pt_rows = leuko.loc[leuko['Patient ID'] == ptid]
-        pt_rows.reset_index(drop=True, inplace=True)
-        # get index where patient is in DataFrame
-        idx = sirsparam.index[sirsparam['Patient ID'] == ptid]
-        # for every index
-        for j in idx: 
-            for i in range(len(pt_rows['Patient ID'])):
-                # check whether time of measurement leukocytes is before time
-                # in DataFrame. If not, go to next measurement of leukocytes.
-                if sirsparam['Min'][j] > pt_rows.at[i, 'Difference']:
-                    # fill in leukocyte value in DataFrame
-                    leuko_val = pt_rows.at[i, 'Value']
-                    sirsparam['Leuko'][j] = leuko_val
+    # Add leuko to vitals: last leukocyte value measured before the end of 
+    # the 10 minutes (as-of join per patient on time after admission, with
+    # the int32 patient IDs of the lab extract in the type of the vitals)
+    ptid = leuko['Patient ID'].to_numpy(dtype=sirsparam['Patient ID'].dtype)
+    leuko = pd.DataFrame({'Patient ID': ptid,
+                          'Min': hours*60, # to minutes
+                          'Leuko': leuko['Value'].to_numpy()})
+    leuko = leuko.sort_values('Min', kind='mergesort')
+    
+    rows = sirsparam[['Patient ID', 'Min']].astype({'Min': np.float64})
+    rows['Row'] = np.arange(len(rows))
+    rows = rows.sort_values('Min', kind='mergesort')
+    rows = pd.merge_asof(rows, leuko, on='Min', by='Patient ID',
+                         allow_exact_matches=False)
+    rows = rows.sort_values('Row')
+    sirsparam['Leuko'] = rows['Leuko'].to_numpy()
+    
+    # Add age of patient to every row of specific patient
+    age = patient_age(patient_information)
+    sirsparam['Age'] = sirsparam['Patient ID'].map(age)
                     
     return sirsparam
 
 
+def sirs_flags(age, temp, leuko, hr, rr):
+    """
+    Function to score the SIRS criteria (corrected for age) for arrays of 
+    measurements. An age group is assigned to every row with a binary search
+    on the upper age limits in normval, after which the normal values of the
+    age group are compared to the measurements for all rows at once. Missing
+    values (NaN) do not meet a criterion.
+
+    Parameters
+    ----------
+    age : age of patient in days
+    temp : rectal temperature
+    leuko : leukocytes
+    hr : heart rate
+    rr : respiratory rate
+
+    Returns
+    -------
+    flags : dict with boolean arrays 'Temp rect', 'Leuko', 'HR' and 'RR'
+
+    """
+    age = np.asarray(age, dtype=np.float64)
+    temp = np.asarray(temp, dtype=np.float64)
+    leuko = np.asarray(leuko, dtype=np.float64)
+    hr = np.asarray(hr, dtype=np.float64)
+    rr = np.asarray(rr, dtype=np.float64)
+    
+    # Age group: first group with upper limit above age, oldest group for
+    # older patients
+    group = np.searchsorted(normval[:, 0], age, side='right')
+    group = np.minimum(group, len(normval) - 1)
+    criteria = normval[group]
+    
+    flags = {'Temp rect': (temp < 36.0) | (temp > 38.5),
+             'Leuko': (leuko < criteria[..., 4]) | (leuko > criteria[..., 5]),
+             'HR': (hr < criteria[..., 1]) | (hr > criteria[..., 2]),
+             'RR': rr > criteria[..., 3]}
+    
+    return flags
+
+
 def sirs_criteria(sirstable):
     """
     Function to determine which patients meet SIRS criteria based on HR, RR, 
@@ -129,94 +166,32 @@ def sirs_criteria(sirstable):
 
     """
     
-    patients = sirstable
-    
     # Where patients age is not empty
-    patients = patients.loc[patients['Age'].notnull()]
-    
-    #replace empty strings with NaN
-    patients = patients.replace(r'^\s*$', np.nan, regex=True) 
-    patients = patients[patients['Age'].notna()]
+    patients = sirstable.loc[sirstable['Age'].notna()]
     patients.reset_index(drop=True, inplace=True)
     
-    # SIRS criteria
-    # normal values per age group
-    normval = np.array([[7, 100, 180, 50, 0, 34, 59],
-                        [31, 100, 180, 40, 5, 19.5, 79],
-                       [730, 90, 180, 34, 5, 17.5, 75],
-                       [1825, 0, 140, 22, 6, 15.5, 74],
-                       [4380, 0, 130, 18, 4.5, 13.5, 83],
-                       [6570, 0, 110, 14, 4.5, 11, 90]])
-    criteria = pd.DataFrame(normval, columns=['Age', 'Heartrate lower',
-                                              'Heartrate upper', 'Resprate',
-                                              'Leuko lower', 'Leuko upper',
-                                              'SBP'])
-    # Age of patient to timedelta format (in days)
-    criteria['Age'] = pd.to_timedelta(criteria['Age'], unit='d')
-    
-    # Create empty DataFrame with patient per row
-    sirs = patients['Patient ID']
-    sirs = pd.Series.to_frame(sirs)
-    sirs['Temp rect'] = ''
-    sirs['Leuko'] = ''
-    sirs['HR'] = ''
-    sirs['RR'] = ''
-    sirs['Sum'] = '' 
-    sirs['Label'] = '' 
-    
-    # for every patient
-    for i in range(len(patients)):
-        # if patient younger than 7 days old
-        if patients['Age'][i] < criteria['Age'][0]: 
-            if patients['Temp rect'][i] < 36.0 or patients['Temp rect'][i] > 38.5:
-                sirs['Temp rect'][i] = 1
-            if patients['Leuko'][i] < criteria['Leuko lower'][0] or patients['Leuko'][i] > criteria['Leuko upper'][0]:
-                sirs['Leuko'][i] = 1
-            if patients['HR'][i] < criteria['Heartrate lower'][0] or patients['HR'][i] > criteria['Heartrate upper'][0]:
-                sirs['HR'][i] = 1
-            if patients['RR'][i] > criteria['Resprate'][0]:
-                sirs['RR'][i] = 1
-                
-        # if patient in oldest age group        
-        elif patients['Age'][i] > criteria['Age'][5]:
-            if patients['Temp rect'][i] < 36.0 or patients['Temp rect'][i] > 38.5:
-                sirs['Temp rect'][i] = 1
-            if patients['Leuko'][i] < criteria['Leuko lower'][5] or patients['Leuko'][i] > criteria['Leuko upper'][5]:
-                sirs['Leuko'][i] = 1
-            if patients['HR'][i] < criteria['Heartrate lower'][5] or patients['HR'][i] > criteria['Heartrate upper'][5]:
-                sirs['HR'][i] = 1
-            if patients['RR'][i] > criteria['Resprate'][5]:
-                sirs['RR'][i] = 1
-        
-        else:
-            for j in range(1,5,1):
-                # check patients age group
-                if patients['Age'][i] > criteria['Age'][j] and patients['Age'][i] < criteria['Age'][j+1]:
-                    if patients['Temp rect'][i] < 36.0 or patients['Temp rect'][i] > 38.5:
-                        sirs['Temp rect'][i] = 1
-                    if patients['Leuko'][i] < criteria['Leuko lower'][j] or patients['Leuko'][i] > criteria['Leuko upper'][j]:
-                        sirs['Leuko'][i] = 1
-                    if patients['HR'][i] < criteria['Heartrate lower'][j] or patients['HR'][i] > criteria['Heartrate upper'][j]:
-                        sirs['HR'][i] = 1
-                    if patients['RR'][i] > criteria['Resprate'][j]:
-                        sirs['RR'][i] = 1
-  
-    # Replace empty values with NaN value and then to 0
-    sirs = sirs.replace(r'^\s*$', np.nan, regex=True)
-    sirs = sirs.fillna(0)
+    # Age of patient in days
+    age = patients['Age']
+    if pd.api.types.is_timedelta64_dtype(age):
+        age = age / pd.Timedelta(days=1)
+    
+    # Score criteria for all rows at once
+    flags = sirs_flags(age, patients['Temp rect'], patients['Leuko'],
+                       patients['HR'], patients['RR'])
+    
+    sirs = patients[['Patient ID']].copy()
+    for criterion in ['Temp rect', 'Leuko', 'HR', 'RR']:
+        sirs[criterion] = flags[criterion].astype(np.int64)
     
     # Take sum of sirscriteria 
     sirs['Sum'] = sirs['Temp rect'] + sirs['Leuko'] + sirs['HR'] + sirs['RR']
     
     # If sum is greater than 1 and at least on of leuko or temp rect is 
     # abnormal, patient meets SIRS criteria
-    sirsyes = sirs[sirs.Sum >= 1] 
-    sirsyes = sirsyes[(sirsyes['Leuko'] == 1) | (sirsyes['Temp rect'] == 1)]
+    sirs['Label'] = (sirs['Sum'] >= 1) & (flags['Leuko'] | flags['Temp rect'])
     
     # Get patients that meet SIRS criteria
-    patients_sirs = sirsyes['Patient ID'].unique()
+    patients_sirs = sirs.loc[sirs['Label'], 'Patient ID'].unique()
     patients_sirs = pd.DataFrame(patients_sirs, columns=['Patient ID'])
    
     return sirs, patients_sirs
-            
-            
\ No newline at end of file
@@ -0,0 +1,398 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Benchmarks for the preprocessing steps on synthetic data with the same layout
+as the laboratory extracts and patients.csv. Run as a script to print the
+timings, e.g. python benchmarks.py
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+# Created functions
+from time_after_surgery import (timeaftersurgery, time_after_surgery,
+                                selectpatients, admissiondate, duringadmission)
+from lab_features import (feature_table, chemie_features, hematologie_features,
+                          bloedgas_features, feature_values, extract_features)
+from cleaning import lab_cleaning
+from ingest import type_extract
+from sirs_monitor import SIRSMonitor, replay_stream
+from time_after_surgery import admissiontable
+from pdmsdata import parameters
+from rolling_median import tumbling_median, sliding_median
+
+
+def synthetic_patients(n_patients, seed=0):
+    """
+    Function to create patient information with the same columns as
+    patients.csv, with admission dates in the study period.
+
+    Parameters
+    ----------
+    n_patients : number of patients
+    seed : seed of the random number generator
+
+    Returns
+    -------
+    patient_information : DataFrame containing patient information
+
+    """
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2019-07-21T00:00:00.000')
+    offset = rng.integers(0, 365*24*3600*1000, n_patients).astype('timedelta64[ms]')
+    admission = pd.Series(start + offset).dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    patient_information = pd.DataFrame({'Patient ID': np.arange(1, n_patients+1),
+                                        'Gender': rng.integers(0, 2, n_patients),
+                                        'Admissiondate': admission,
+                                        'Cardio': 1, 'OK': 1, 'CPB': 1})
+    return patient_information
+
+
+def synthetic_birthdates(patient_information, seed=0):
+    """
+    Function to create dates of birth with the same columns as birthdate.csv,
+    for patients between 1 day and 18 years old at admission.
+
+    Returns
+    -------
+    birthdate : DataFrame containing date of birth (string) per patient ID
+
+    """
+    rng = np.random.default_rng(seed)
+    admission = pd.to_datetime(patient_information['Admissiondate'])
+    age = rng.integers(1, 18*365, len(patient_information)).astype('timedelta64[D]')
+    birthdate = pd.DataFrame({'Patient ID': patient_information['Patient ID'].to_numpy(),
+                              'Birthdate': (admission - age).dt.strftime('%Y-%m-%d %H:%M:%S.%f')})
+    return birthdate
+
+
+def synthetic_labs(patient_information, rows_per_patient, measurements,
+                   seed=0):
+    """
+    Function to create a laboratory extract with the same columns as
+    Lab_Chemie.csv, Lab_Bloedgas.csv and Lab_Hematologie.csv.
+
+    Parameters
+    ----------
+    patient_information : DataFrame containing patient information
+    rows_per_patient : number of measurements per patient
+    measurements : list of measurement names to draw from
+    seed : seed of the random number generator
+
+    Returns
+    -------
+    dataframe : DataFrame containing parameter values per patient ID,
+        including time of measurement as string.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = len(patient_information)*rows_per_patient
+
+    ptid = np.repeat(patient_information['Patient ID'].to_numpy(), rows_per_patient)
+    admission = np.repeat(pd.to_datetime(patient_information['Admissiondate']).to_numpy(),
+                          rows_per_patient)
+    # measurements between 12 hours before and 72 hours after admission
+    offset = rng.integers(-12*3600*1000, 72*3600*1000, n_rows).astype('timedelta64[ms]')
+    measured = pd.Series(admission + offset).dt.strftime('%Y-%m-%d %H:%M:%S.%f')
+
+    dataframe = pd.DataFrame({'Patient ID': ptid,
+                              'Measurement': rng.choice(measurements, n_rows),
+                              'Value': np.round(rng.normal(10, 3, n_rows), 2),
+                              'Unit': '',
+                              'Time': measured})
+    return dataframe
+
+
+def synthetic_vitals(patient_information, hours=24, seed=0):
+    """
+    Function to create PDMS data with the same columns as ICKGsepsis.csv, one
+    row per minute from admission until hours after admission.
+
+    Parameters
+    ----------
+    patient_information : DataFrame containing patient information
+    hours : number of hours of data per patient
+    seed : seed of the random number generator
+
+    Returns
+    -------
+    dataframe : DataFrame containing vital parameters per patient ID,
+        including time of measurement as string.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_minutes = hours*60
+    n_rows = len(patient_information)*n_minutes
+
+    ptid = np.repeat(patient_information['Patient ID'].to_numpy(), n_minutes)
+    admission = pd.to_datetime(patient_information['Admissiondate']).dt.floor('min')
+    measured = (np.repeat(admission.to_numpy(), n_minutes) +
+                np.tile(np.arange(1, n_minutes+1), len(patient_information)).astype('timedelta64[m]'))
+
+    dataframe = pd.DataFrame({'Nr': np.arange(n_rows),
+                              'Patient ID': ptid,
+                              'Datetime': pd.Series(measured).dt.strftime('%d-%m-%Y %H:%M')})
+    means = {'HR': 130, 'RR': 30, 'SpO2': 97, 'SBP': 85, 'DBP': 50, 'MAP': 62,
+             'Temp1': 37, 'Temp2': 37, 'Temp rect': 37.5, 'etCO2': 40}
+    for parameter, mean in means.items():
+        dataframe[parameter] = np.round(rng.normal(mean, 0.05*mean, n_rows), 1)
+    return dataframe
+
+
+def timed(function, *args):
+    """Run function once and return the result and the wall-clock time in s"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_timeaftersurgery(n_rows=(10**3, 10**4, 10**5, 10**6)):
+    """
+    Benchmark of time_after_surgery.timeaftersurgery for increasing number of
+    rows of a laboratory extract.
+
+    Returns
+    -------
+    results : DataFrame with number of rows, time in seconds and rows/s
+
+    """
+    results = []
+    for n in n_rows:
+        patient_information = synthetic_patients(max(n//100, 1))
+        labs = synthetic_labs(patient_information, 100, ['Leukocyten'])
+        labs = labs.merge(patient_information[['Patient ID', 'Admissiondate']],
+                          on='Patient ID')
+        _, seconds = timed(timeaftersurgery, labs)
+        results.append([len(labs), seconds, len(labs)/seconds])
+
+    results = pd.DataFrame(results, columns=['Rows', 'Seconds', 'Rows/s'])
+    return results
+
+
+def measurement_names(feature_list):
+    """All measurement names of a feature list, plus one unrelated name"""
+    names = [name for _, aliases, _ in feature_list for name in aliases]
+    return names + ['Natrium (capillair)']
+
+
+def bench_feature_table(cohort_size=250, scales=(1, 10, 100),
+                        rows_per_patient=30):
+    """
+    Benchmark of lab_features.feature_table for a cohort of cohort_size 
+    patients and cohorts of 10 and 100 times that size.
+
+    Returns
+    -------
+    results : DataFrame with number of patients, rows, time in seconds and
+        patients/s
+
+    """
+    results = []
+    for scale in scales:
+        patient_information = synthetic_patients(cohort_size*scale)
+        labs = []
+        for seed, feature_list in enumerate([chemie_features,
+                                             hematologie_features,
+                                             bloedgas_features]):
+            lab = synthetic_labs(patient_information, rows_per_patient,
+                                 measurement_names(feature_list), seed)
+            labs.append(time_after_surgery(lab, patient_information))
+        
+        _, seconds = timed(feature_table, labs[0], labs[1], labs[2],
+                           patient_information, 12)
+        n_rows = sum(len(lab) for lab in labs)
+        results.append([len(patient_information), n_rows, seconds,
+                        len(patient_information)/seconds])
+        
+    results = pd.DataFrame(results, columns=['Patients', 'Rows', 'Seconds',
+                                             'Patients/s'])
+    return results
+
+
+def synthetic_minutes(n_minutes, missing=0.1, seed=0):
+    """
+    Function to create minute data of the PDMS parameters, with a fraction
+    missing of the values missing (NaN).
+
+    Returns
+    -------
+    vitals : DataFrame (minutes x parameters) with float64 values
+
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(100, 15, (n_minutes, len(parameters)))
+    values[rng.random(values.shape) < missing] = np.nan
+    return pd.DataFrame(values, columns=parameters)
+
+
+def bench_rolling_median(n_minutes=(1440, 14400), width=10):
+    """
+    Benchmark of the medians of windows of width minutes against the median
+    of pandas slices, for tumbling windows (one median per width minutes) and
+    sliding windows (one median per minute).
+
+    Returns
+    -------
+    results : DataFrame with number of minutes, window type, time in seconds
+        of pandas slices and of rolling_median, and speed-up
+
+    """
+    results = []
+    for n in n_minutes:
+        vitals = synthetic_minutes(n)
+        values = vitals.to_numpy()
+
+        def slices_tumbling():
+            return [vitals.iloc[i:i+width].median() for i in range(0, n, width)]
+
+        def slices_sliding():
+            return [vitals.iloc[max(i-width+1, 0):i+1].median() for i in range(n)]
+
+        _, pandas_tumbling = timed(slices_tumbling)
+        _, kernel_tumbling = timed(tumbling_median, values, width)
+        _, pandas_sliding = timed(slices_sliding)
+        _, kernel_sliding = timed(sliding_median, values, width)
+        results.append([n, 'tumbling', pandas_tumbling, kernel_tumbling,
+                        pandas_tumbling/kernel_tumbling])
+        results.append([n, 'sliding', pandas_sliding, kernel_sliding,
+                        pandas_sliding/kernel_sliding])
+
+    results = pd.DataFrame(results, columns=['Minutes', 'Window', 'Pandas (s)',
+                                             'Kernel (s)', 'Speed-up'])
+    return results
+
+
+def bench_sirs_monitor(n_patients=(10, 100), hours=24):
+    """
+    Benchmark of the latency of sirs_monitor.SIRSMonitor per measurement, with
+    the measurements of all patients in time order as in replay.
+
+    Returns
+    -------
+    results : DataFrame with number of patients, measurements, median, 99th
+        percentile and maximal latency per measurement in microseconds and
+        measurements/s
+
+    """
+    results = []
+    for n in n_patients:
+        patient_information = synthetic_patients(n)
+        birthdate = synthetic_birthdates(patient_information)
+        vitals = type_extract(synthetic_vitals(patient_information, hours), 'pdms')
+        labs = type_extract(synthetic_labs(patient_information, 30, ['Leukocyten']), 'lab')
+        
+        admission = admissiontable(type_extract(patient_information, 'patients'))
+        age = admission - pd.to_datetime(birthdate.set_index('Patient ID')['Birthdate'])
+        monitor = SIRSMonitor(admission, age)
+        stream = replay_stream(vitals, labs)
+        
+        latency = np.empty(len(stream))
+        start = time.perf_counter()
+        for i, (ptid, measured, kind, hr, rr, temp) in enumerate(stream.itertuples(index=False)):
+            t = time.perf_counter_ns()
+            if kind == 0:
+                monitor.vital(ptid, measured, float(hr), float(rr), float(temp))
+            else:
+                monitor.leuko(ptid, measured, float(hr))
+            latency[i] = time.perf_counter_ns() - t
+        seconds = time.perf_counter() - start
+        
+        latency /= 1000
+        results.append([n, len(stream), np.percentile(latency, 50),
+                        np.percentile(latency, 99), latency.max(),
+                        len(stream)/seconds])
+    
+    results = pd.DataFrame(results, columns=['Patients', 'Measurements',
+                                             'p50 (us)', 'p99 (us)', 'Max (us)',
+                                             'Measurements/s'])
+    return results
+
+
+def memory_usage(stage, dataframe):
+    """
+    Function to measure the memory of a DataFrame after a stage.
+
+    Returns
+    -------
+    usage : list with name of stage, number of rows, memory in MB (including
+        the strings of object and categorical columns), bytes per row and the
+        types of the columns
+
+    """
+    size = dataframe.memory_usage(index=False, deep=True).sum()
+    dtypes = ', '.join(sorted(set(map(str, dataframe.dtypes))))
+    return [stage, len(dataframe), size/2**20, size/max(len(dataframe), 1),
+            dtypes]
+
+
+def memory_report(lab, patient_information, hours):
+    """
+    Function to run a laboratory extract from time_after_surgery to 
+    lab_cleaning and measure the memory after every stage. The stages change
+    their input, so the memory is measured directly after each stage.
+
+    Returns
+    -------
+    report : DataFrame with the memory_usage per stage
+
+    """
+    report = [memory_usage('extract', lab)]
+    lab = selectpatients(lab, patient_information)
+    report.append(memory_usage('selectpatients', lab))
+    lab = admissiondate(lab, patient_information)
+    report.append(memory_usage('admissiondate', lab))
+    lab = duringadmission(lab)
+    report.append(memory_usage('duringadmission', lab))
+    lab = timeaftersurgery(lab)
+    report.append(memory_usage('timeaftersurgery', lab))
+    report.append(memory_usage('feature_values',
+                               feature_values(lab, chemie_features)))
+    features = extract_features(lab, patient_information, hours, chemie_features)
+    report.append(memory_usage('extract_features', features))
+    report.append(memory_usage('lab_cleaning', lab_cleaning(features)))
+    
+    report = pd.DataFrame(report, columns=['Stage', 'Rows', 'MB', 'Bytes/row',
+                                           'Types'])
+    return report
+
+
+def lab_memory_report(n_patients=1000, rows_per_patient=100, hours=12):
+    """
+    Memory per stage from loading a laboratory extract to lab_cleaning, for
+    the columns as read from the .csv file (strings) and for the typed
+    layout of ingest.py.
+
+    Returns
+    -------
+    report : DataFrame with memory_report per layout
+
+    """
+    patient_information = synthetic_patients(n_patients)
+    lab = synthetic_labs(patient_information, rows_per_patient,
+                         measurement_names(chemie_features))
+    patient_information = type_extract(patient_information, 'patients')
+    
+    reports = []
+    for layout, extract in [('strings', lab), ('typed', type_extract(lab, 'lab'))]:
+        report = memory_report(extract, patient_information, hours)
+        report.insert(0, 'Layout', layout)
+        reports.append(report)
+    return pd.concat(reports, ignore_index=True)
+
+
+if __name__ == '__main__':
+    print('time_after_surgery.timeaftersurgery')
+    print(bench_timeaftersurgery())
+    print('lab_features.feature_table')
+    print(bench_feature_table())
+    print('rolling_median')
+    print(bench_rolling_median())
+    print('sirs_monitor.SIRSMonitor')
+    print(bench_sirs_monitor())
+    print('memory of a laboratory extract per stage')
+    print(lab_memory_report())
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Checks of the preprocessing steps against a direct (slow) computation on
+synthetic data with the layout of the extracts (benchmarks.py), and of the
+measurement dictionary. Every check raises an AssertionError if the results
+differ. Run as a script to run all checks, e.g. python checks.py; the lab
+extracts in the working directory are checked against the dictionary.
+"""
+
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Created functions
+from benchmarks import (synthetic_patients, synthetic_birthdates,
+                        synthetic_labs, synthetic_vitals, measurement_names)
+from feature_state import FeatureStates
+from ingest import extracts, read_extract, type_extract
+from lab_features import (chemie_features, hematologie_features, bloedgas_features,
+                          extract_features, extract_features_hours)
+from measurements import (catalogue_path, read_catalogue, feature_names,
+                          query_names, analyte_name, analytes, measurement_codes)
+from pdmsdata import median_per_10min, parameters, vitalsigns_pdms, all_vitals
+from SIRScriteria import sirs_table, sirs_criteria
+from score_patients import patient_features
+from sirs_monitor import replay_extracts
+from time_after_surgery import time_after_surgery, hours_after_admission
+from time_index import as_timeindex
+
+# Lab extracts of main_preprocessing.py
+lab_extracts = ['Lab_Chemie.csv', 'Lab_Hematologie.csv', 'Lab_Bloedgas.csv']
+
+# Names of the same analyte and the analyte (without case)
+analyte_groups = {'pH': ['PH', 'pH', 'pH (art)', 'pH (arterieel)'],
+                  'pO2': ['PO2', 'pO2', 'pO2 (art)', 'pO2 (arterieel)'],
+                  'Chloride': ['Chloride', 'Chloride (art)', 'Chloride (arterieel)',
+                               'Chloride(arterieel)'],
+                  'O2 saturatie': ['O2 Saturatie', 'O2 saturatie (MBO)',
+                                   'O2 saturatie (navelstreng arterieel)'],
+                  'Erytrocyten (arterieel': ['Erytrocyten (arterieel'],
+                  'Cortisol (09:00)': ['Cortisol (09:00)'],
+                  'PML-RARa t(15;17)': ['PML-RARa t(15;17)']}
+
+
+def write_extract(dataframe, path):
+    """Write a DataFrame as .csv extract: ';' separated without header"""
+    dataframe.to_csv(path, sep=';', header=False, index=False)
+
+
+def check_median_duplicates(n_rows=3000, n_patients=5, seed=0):
+    """
+    Check that median_per_10min uses all rows of a window, also several rows
+    of a patient in the same minute, as the median of the rows per window.
+    """
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(0, 24*60, n_rows)
+    vitalsigns = pd.DataFrame({'Patient ID': rng.integers(1, n_patients + 1, n_rows),
+                               'Difference': pd.to_timedelta(minutes*60 + rng.integers(0, 60, n_rows),
+                                                             unit='s')})
+    for parameter in parameters:
+        values = rng.normal(100, 10, n_rows)
+        values[rng.random(n_rows) < 0.1] = np.nan
+        vitalsigns[parameter] = values
+    assert vitalsigns.assign(Minute=minutes).duplicated(['Patient ID', 'Minute']).any()
+
+    patidunique, medians, samples = median_per_10min(vitalsigns, 0, 24)
+
+    expected = vitalsigns.groupby([vitalsigns['Patient ID'], minutes // 10])[parameters].median()
+    patient = np.searchsorted(patidunique, expected.index.get_level_values(0))
+    window = expected.index.get_level_values(1)
+    assert np.allclose(medians[patient, window], expected.to_numpy(), equal_nan=True)
+    assert samples.sum() == n_rows
+
+
+def check_sirs_monitor(n_patients=40, seed=0):
+    """
+    Check that replaying the extracts through the SIRS monitor
+    (sirs_monitor.replay_extracts) gives the same patients and SIRS labels as
+    sirs_criteria, for a synthetic cohort with some duplicate minutes in the
+    PDMS data.
+    """
+    rng = np.random.default_rng(seed)
+    patient_information = synthetic_patients(n_patients, seed)
+    vitals = synthetic_vitals(patient_information, 24, seed)
+    # Wider spread of temperature, so both labels occur
+    vitals['Temp rect'] = np.round(rng.normal(37.8, 1, len(vitals)), 1)
+    duplicates = vitals.sample(frac=0.02, random_state=seed)
+    duplicates['HR'] += 20
+    vitals = pd.concat([vitals, duplicates], ignore_index=True)
+    labs = synthetic_labs(patient_information, 30, ['Leukocyten', 'Hemoglobine'],
+                          seed)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        # sirs_criteria reads birthdate.csv from the working directory
+        os.chdir(folder)
+        try:
+            write_extract(patient_information, 'patients.csv')
+            write_extract(synthetic_birthdates(patient_information, seed), 'birthdate.csv')
+            write_extract(vitals, 'ICKGsepsis.csv')
+            write_extract(labs, 'Lab_Hematologie.csv')
+
+            # Batch: all_vitals, sirs_table and sirs_criteria
+            vitalsigns, patients = vitalsigns_pdms('ICKGsepsis.csv', 'patients.csv')
+            hematologie = time_after_surgery(read_extract('Lab_Hematologie.csv', 'lab'),
+                                             patients)
+            sirs, patients_sirs = sirs_criteria(sirs_table(all_vitals(vitalsigns, patients),
+                                                           hematologie, patients))
+
+            # Stream: SIRS monitor
+            _, verdicts = replay_extracts('ICKGsepsis.csv', 'Lab_Hematologie.csv',
+                                          'patients.csv')
+        finally:
+            os.chdir(cwd)
+
+    expected = pd.Series(np.unique(sirs['Patient ID']))
+    expected = pd.DataFrame({'Patient ID': expected,
+                             'SIRS': expected.isin(patients_sirs['Patient ID'])})
+    verdicts = verdicts.sort_values('Patient ID').reset_index(drop=True)
+    assert expected['SIRS'].any() and not expected['SIRS'].all()
+    assert verdicts['Patient ID'].tolist() == expected['Patient ID'].tolist()
+    assert verdicts['SIRS'].tolist() == expected['SIRS'].tolist()
+
+
+def check_feature_states(n_patients=30, hours=12, seed=0):
+    """
+    Check that the incremental features (feature_state.FeatureStates) are the
+    same as the features of score_patients.patient_features, for a synthetic
+    cohort with several PDMS rows of a patient in the same minute.
+    """
+    patient_information = synthetic_patients(n_patients, seed)
+    labs = {extract: synthetic_labs(patient_information, 30,
+                                    measurement_names(feature_list), seed + i)
+            for i, (extract, feature_list) in enumerate([('chemie', chemie_features),
+                                                         ('hematologie', hematologie_features),
+                                                         ('bloedgas', bloedgas_features)])}
+    vitals = synthetic_vitals(patient_information, hours, seed)
+    duplicates = vitals.sample(frac=0.2, random_state=seed)
+    duplicates['HR'] += 50
+    vitals = pd.concat([vitals, duplicates, duplicates], ignore_index=True)
+    patient_information = type_extract(patient_information, 'patients')
+    labs = {extract: type_extract(lab, 'lab') for extract, lab in labs.items()}
+    vitals = type_extract(vitals, 'pdms')
+
+    expected = patient_features(labs['chemie'], labs['hematologie'], labs['bloedgas'],
+                                vitals, patient_information, hours)
+
+    states = FeatureStates(patient_information, hours)
+    for extract, lab in labs.items():
+        states.lab(extract, lab)
+    states.vitals(vitals)
+    features = states.features(expected['Patient ID'].tolist())
+
+    assert features.columns.tolist() == expected.columns.tolist()
+    assert np.allclose(features.to_numpy(dtype=float), expected.to_numpy(dtype=float),
+                       equal_nan=True)
+
+
+def check_window_boundaries(n_patients=20, seed=0):
+    """
+    Check that the lab feature windows use the exact time after admission:
+    measurements 1 ms before and after the end of a window (the same float32
+    'Difference') are in and out of the window, as in SIRScriteria.py.
+    """
+    rng = np.random.default_rng(seed)
+    patient_information = synthetic_patients(n_patients, seed)
+    offset = pd.to_timedelta(rng.choice([-1, 1], n_patients), unit='ms')
+    lab = pd.DataFrame({'Patient ID': patient_information['Patient ID'],
+                        'Measurement': 'Leukocyten',
+                        'Value': rng.normal(10, 2, n_patients).astype(np.float32),
+                        'Unit': '10^9/l',
+                        'Time': pd.to_datetime(patient_information['Admissiondate'])
+                        + pd.Timedelta(hours=12) + offset})
+    lab = time_after_surgery(lab, patient_information)
+    assert (lab['Difference'] == 12).all()
+
+    expected = np.where(hours_after_admission(lab) <= 12, lab['Value'], np.nan)
+    for dataframe in (lab, as_timeindex(lab)):
+        features = extract_features(dataframe, patient_information, 12,
+                                    hematologie_features)
+        features = features.set_index('Patient ID').loc[lab['Patient ID']]
+        assert np.array_equal(features['Leukocyten'], expected, equal_nan=True)
+        features = extract_features_hours(dataframe, patient_information,
+                                          [12, 24], hematologie_features)
+        features = features.xs(12, level='Hours').loc[lab['Patient ID']]
+        assert np.array_equal(features['Leukocyten'], expected, equal_nan=True)
+
+
+def check_measurement_codes(paths=()):
+    """
+    Check that the catalogue is read as one name per row, also names with ';'
+    or quotes, and that every name of the feature lists, of the queries
+    (Lab_*.sql), of the synthetic extracts and of the lab extracts in paths
+    has a code in the measurement dictionary.
+    """
+    with open(catalogue_path, encoding='utf-8-sig') as file:
+        rows = [line for line in file.read().splitlines() if line]
+    catalogue = read_catalogue()
+    assert len(catalogue) == len(rows)
+    assert not any(name.startswith('"') for name in catalogue)
+    assert any(';' in name for name in catalogue)
+
+    assert 'Creatinine' in query_names and 'Bicarbonaat (arterieel)' in query_names
+    names = feature_names + query_names + [name for feature_list in (chemie_features,
+                                                       hematologie_features,
+                                                       bloedgas_features)
+                             for name in measurement_names(feature_list)]
+    for path in paths:
+        lab = pd.read_csv(path, sep=';', names=extracts['lab']['names'],
+                          index_col=False, usecols=['Measurement'])
+        names += lab['Measurement'].dropna().unique().tolist()
+    names = pd.Series(names + catalogue)
+    missing = names[measurement_codes(names) < 0].unique()
+    assert len(missing) == 0, missing
+
+
+def check_analyte_names():
+    """
+    Check that the names of analyte_groups have the same analyte code and the
+    expected analyte name, and that the groups have different codes.
+    """
+    codes = []
+    for analyte, names in analyte_groups.items():
+        assert all(analyte_name(name).casefold() == analyte.casefold()
+                   for name in names), (analyte, names)
+        group = analytes(pd.Series(names))
+        assert (group >= 0).all() and (group == group[0]).all(), (analyte, names)
+        codes.append(group[0])
+    assert len(set(codes)) == len(codes)
+
+
+if __name__ == '__main__':
+    for check in [check_median_duplicates, check_sirs_monitor,
+                  check_feature_states, check_window_boundaries, check_analyte_names]:
+        check()
+        print('%-30s ok' % check.__name__)
+    paths = [path for path in lab_extracts if os.path.exists(path)]
+    check_measurement_codes(paths)
+    print('%-30s ok (%d lab extracts)' % ('check_measurement_codes', len(paths)))
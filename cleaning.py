@@ -34,8 +34,8 @@ def lab_cleaning(dataframe):
     return dataframe
 
 def lab_imputation(dataframe):
-    # SHOULD BE CHANGED! NEW SAMPLE (TEST) SHOULD BE IMPUTED BASED ON TRAIN SET 
-    # rf_cv.py !!!
+    # Imputes dataframe on its own values; rf_cv.py uses preprocess_pipeline.py,
+    # which imputes the testset based on the trainset
     imputer = IterativeImputer(random_state=42)
     imputed = imputer.fit_transform(dataframe)
     dataframe = pd.DataFrame(imputed, columns=dataframe.columns)
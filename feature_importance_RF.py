@@ -5,9 +5,61 @@ Author: Marit Verboom
 Date: 02/2022 - 05/2022
 """
 
+import numpy as np
 import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.tree._tree import TREE_LEAF
+
+
+def tree_importance(tree, n_features):
+    """
+    Function to calculate the signed score of every feature in one decision
+    tree, for all nodes at once.
+    For explanation see: https://scikit-learn.org/stable/auto_examples/tree/plot_unveil_tree_structure.html
+    
+    Parameters
+    ----------
+    tree : tree_ attribute of a fitted DecisionTreeClassifier
+    n_features : number of features of the classifier
+
+    Returns
+    -------
+    scores : float64 array containing the sum of the scores per feature
+    used : features of the internal nodes, in order of the nodes
 
-def feature_importance_RF(randomf, feature_names):
+    """
+    # Internal nodes (leaves have no children)
+    internal = np.flatnonzero(tree.children_left != TREE_LEAF)
+    used = tree.feature[internal]
+    
+    # Number of SIRS (0) and sepsis (1) patients in left and right child node
+    classes_left = tree.value[tree.children_left[internal], 0]
+    classes_right = tree.value[tree.children_right[internal], 0]
+    sirs_left, sepsis_left = classes_left[:, 0], classes_left[:, 1]
+    sirs_right, sepsis_right = classes_right[:, 0], classes_right[:, 1]
+    
+    # is left node SIRS node?
+    # Mixed nodes: ratio SIRS/sepsis is higher in left node than in right node
+    # Otherwise: left node is SIRS node if only the right node contains sepsis
+    mixed = (sepsis_left > 0) & (sepsis_right > 0)
+    is_SIRS = np.where(mixed, sirs_left*sepsis_right > sirs_right*sepsis_left,
+                       sepsis_right > 0)
+    
+    # lower values (left node) of the feature linked to class SIRS (0): +1, 
+    # higher value (right node) linked to class sepsis (1): -1
+    # No sepsis in both child nodes: no direction, score 0
+    sign = np.where(is_SIRS, 1.0, -1.0)
+    sign[(sepsis_left == 0) & (sepsis_right == 0)] = 0.0
+    
+    # Weight of feature based on the remaining patients in the smallest childnode 
+    weight = np.minimum(classes_left.sum(axis=1), classes_right.sum(axis=1))
+    
+    scores = np.bincount(used, weights=sign*weight, minlength=n_features)
+    
+    return scores, used
+
+
+def feature_importance_RF(randomf, feature_names, n_jobs=None):
     """
     Function to calculate a score representing the importance of features used
     in the Random Forest classifier
@@ -16,6 +68,7 @@ def feature_importance_RF(randomf, feature_names):
     ----------
     randomf : Random Forest model.
     feature_names : DataFrame containing all feature names
+    n_jobs : number of threads, the trees are scored in parallel
 
     Returns
     -------
@@ -24,67 +77,26 @@ def feature_importance_RF(randomf, feature_names):
     """
     feature_names = feature_names.sort_index()
     feature_names = feature_names.reset_index(drop=True)  
-    dict_sign = dict()
     
     # number of trees used in the Random Forest estimator
     n_trees = len(randomf.estimators_)    
+    n_features = randomf.n_features_in_
     
-    # for every tree in the RF classifier
-    for clf in randomf.estimators_:           
-        
-        # Parameters of RF classifier
-        # For explanation see: https://scikit-learn.org/stable/auto_examples/tree/plot_unveil_tree_structure.html
-        n_nodes = clf.tree_.node_count
-        children_left = clf.tree_.children_left
-        children_right = clf.tree_.children_right
-        feature = clf.tree_.feature
-        threshold = clf.tree_.threshold
-        value = clf.tree_.value
-        
-        # for every node
-        for i in range(n_nodes):   
-            # if threshold = (-)2, the node is a resulting leaf
-            if abs(threshold[i]) != 2:      
-                classes_left = value[children_left[i]]
-                classes_right = value[children_right[i]]
-                
-                # is left node SIRS node?
-                if classes_left[0][1] > 0 and classes_right[0][1] > 0: 
-                    # Left and right node are mixed leaves, containing both 0 and 1 labels 
-                    # is_SIRS is True if: ratio SIRS/sepsis is higher in left node than in right node    
-                    is_SIRS = classes_left[0][0]/classes_left[0][1] > classes_right[0][0]/classes_right[0][1]
-                elif classes_left[0][1] == 0 and classes_right[0][1] > 0:
-                    # left node =  SIRS
-                    is_SIRS = True
-                elif classes_left[0][1] > 0 and classes_right[0][1] == 0:
-                    # right node =  SIRS
-                    is_SIRS = False
-      
-                
-                # Weight of feature based on the remaining patients in the smallest childnode 
-                weight = min([classes_left[0][0]+classes_left[0][1], classes_right[0][0]+classes_right[0][1]])
-                if is_SIRS:
-                    # lower values (left node) of the feature are linked to class SIRS (0)
-                    coef = weight
-                else:
-                    # higher value (right node)  of the feature is linked to class sepsis (1)
-                    coef = -1*weight
-                    
-                # Feature importance per feature
-                key = feature_names[feature[i]]
-                try: 
-                    feature_list = dict_sign[key]
-                except KeyError:
-                    feature_list = []
-                feature_list.append(coef)
-                dict_sign[key] = feature_list
+    # Scores per tree of the RF classifier
+    trees = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(tree_importance)(clf.tree_, n_features)
+        for clf in randomf.estimators_)
     
     # mean feature importance of all trees
-    mean_sign = dict()
-    for feature in dict_sign:
-        mean_sign[feature] = sum(dict_sign[feature])/n_trees
+    scores = np.sum([scores for scores, _ in trees], axis=0)/n_trees
+    
+    # Only features used in the trees, in order of first use
+    used = np.concatenate([used for _, used in trees])
+    _, first = np.unique(used, return_index=True)
+    used = used[np.sort(first)]
     
-    mean_coef = pd.DataFrame.from_dict(mean_sign, orient='index', columns=['Scores'])
+    mean_coef = pd.DataFrame({'Scores': scores[used]},
+                             index=feature_names.to_numpy()[used])
     mean_coef['Specs'] = mean_coef.index
     
-    return mean_coef
\ No newline at end of file
+    return mean_coef
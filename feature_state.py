@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Incremental features per patient for repeated scoring. A PatientFeatureState
+keeps the maximal or minimal value per laboratory feature (as defined in
+lab_features.py) and the measurements of the 10-minute windows of the vital
+parameters in the 2 hours before the moment of prediction (vitals_postsurgery
+in pdmsdata.py). A new measurement is added in O(1), so the features after a
+new result do not require the history of the patient. Once all measurements
+until the moment of prediction are added, the features are the same as those
+of score_patients.patient_features.
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+
+# Created functions
+from lab_features import lab_extracts, lab_columns
+from pdmsdata import parameters
+from rolling_median import tumbling_median
+from time_after_surgery import admissiontable
+
+# Maximal (True) or minimal (False) value per laboratory column
+lab_maximum = np.array([aggregation == 'max' for _, feature_list in lab_extracts
+                        for _, _, aggregation in feature_list])
+
+# Column number per measurement name per extract
+lab_names = {}
+offset = 0
+for extract, feature_list in lab_extracts:
+    lab_names[extract] = {name: offset + i
+                          for i, (_, aliases, _) in enumerate(feature_list)
+                          for name in aliases}
+    offset += len(feature_list)
+
+
+def feature_columns():
+    """
+    Columns of the feature vector, the same as the merge of feature_table and
+    vitals_postsurgery: names in both get suffix '_x' (laboratory) and '_y'
+    (vital parameters).
+    """
+    overlap = set(lab_columns) & set(parameters)
+    return (['Patient ID'] +
+            [name + '_x' if name in overlap else name for name in lab_columns] +
+            [name + '_y' if name in overlap else name for name in parameters])
+
+
+class PatientFeatureState:
+    """
+    Features of one patient at a moment of prediction, updated with every
+    new measurement.
+
+    Parameters
+    ----------
+    ptid : patient ID
+    admission : date and time of admission
+    hours : hours after admission of the moment of prediction
+    """
+
+    def __init__(self, ptid, admission, hours):
+        self.ptid = ptid
+        self.admission = pd.Timestamp(admission)
+        self.hours = hours
+        self.lab = np.full(len(lab_columns), np.nan)
+
+        # 10-minute windows from 2 hours before the moment of prediction, with
+        # the measurements per window (all rows count in the median, also rows
+        # with the same minute, as in median_per_10min)
+        self.start = hours - 2
+        self.n_windows = int(round((hours - self.start)*6))
+        self.rows = [[] for _ in range(self.n_windows)]
+        self.medians = np.full((self.n_windows, len(parameters)), np.nan)
+        self.samples = 0
+        # Windows with new measurements since the last median
+        self.changed = set()
+
+    def lab_value(self, extract, measurement, time, value):
+        """
+        Add a laboratory measurement.
+
+        Parameters
+        ----------
+        extract : 'chemie', 'hematologie' or 'bloedgas'
+        measurement : measurement name as in the extract
+        time : date and time of measurement
+        value : measured value
+
+        """
+        column = lab_names[extract].get(measurement)
+        if column is None or np.isnan(value):
+            return
+
+        # During admission until the moment of prediction (time_after_surgery)
+        difference = pd.Timestamp(time) - self.admission
+        hours = difference // pd.Timedelta(microseconds=1)/10**6/3600
+        if not 0 < hours <= self.hours:
+            return
+
+        current = self.lab[column]
+        if np.isnan(current):
+            self.lab[column] = value
+        elif lab_maximum[column]:
+            self.lab[column] = max(current, value)
+        else:
+            self.lab[column] = min(current, value)
+
+    def vital(self, time, values):
+        """
+        Add a measurement of the vital parameters (one minute of PDMS data).
+
+        Parameters
+        ----------
+        time : date and time of measurement
+        values : value per parameter, in the order of pdmsdata.parameters
+
+        """
+        difference = pd.Timestamp(time) - self.admission
+        if not self.start < difference / pd.Timedelta(hours=1) < self.hours:
+            return
+
+        minute = difference // pd.Timedelta(minutes=1) - int(round(self.start*60))
+        if not 0 <= minute < self.n_windows*10:
+            return
+        self.rows[minute // 10].append(values)
+        self.samples += 1
+        self.changed.add(minute // 10)
+
+    def features(self):
+        """
+        Current feature vector, see feature_columns.
+
+        Returns
+        -------
+        features : array with patient ID, laboratory features and mean of the
+            10-minute medians of the vital parameters
+
+        """
+        for window in self.changed:
+            rows = self.rows[window]
+            self.medians[window] = tumbling_median(np.array(rows), len(rows))[0]
+        self.changed.clear()
+
+        vitals = np.full(len(parameters), np.nan)
+        if self.samples > 0:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', category=RuntimeWarning)
+                vitals = np.nanmean(self.medians, axis=0)
+
+        return np.concatenate([[self.ptid], self.lab, vitals])
+
+
+class FeatureStates:
+    """
+    Feature states of all patients in patient_information.
+
+    Parameters
+    ----------
+    patient_information : DataFrame containing patient information
+    hours : hours after admission of the moment of prediction
+    """
+
+    def __init__(self, patient_information, hours):
+        # Last admission per patient, as in time_after_surgery.py
+        admission = admissiontable(patient_information)
+        self.states = {ptid: PatientFeatureState(ptid, admitted, hours)
+                       for ptid, admitted in admission.items()}
+
+    def lab(self, extract, dataframe):
+        """Add the rows of a laboratory extract (columns of the lab extracts)"""
+        for ptid, measurement, value, time in zip(dataframe['Patient ID'],
+                                                  dataframe['Measurement'],
+                                                  dataframe['Value'],
+                                                  dataframe['Time']):
+            state = self.states.get(ptid)
+            if state is not None:
+                state.lab_value(extract, measurement, time, float(value))
+
+    def vitals(self, dataframe):
+        """Add the rows of PDMS data (columns of ICKGsepsis.csv)"""
+        values = dataframe[parameters].to_numpy(dtype=float)
+        for ptid, time, row in zip(dataframe['Patient ID'], dataframe['Datetime'],
+                                   values):
+            state = self.states.get(ptid)
+            if state is not None:
+                state.vital(time, row)
+
+    def features(self, ptids=None):
+        """
+        Current features of the patients in ptids (default all patients).
+
+        Returns
+        -------
+        features : DataFrame with the columns of feature_columns
+
+        """
+        if ptids is None:
+            ptids = list(self.states)
+        features = pd.DataFrame([self.states[ptid].features() for ptid in ptids],
+                                columns=feature_columns())
+        features['Patient ID'] = np.asarray(ptids)
+        return features
@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Loading of the .csv extracts (laboratory, PDMS, patient information and date
+of birth). Every extract is converted once to a typed columnar file in the
+folder .cache next to the .csv file, with measurement names as categorical of
+the measurement dictionary (measurements.py), int32 patient IDs of the lab
+extracts, datetime64 timestamps and float32 values. Next runs load the
+columnar file, which is rebuilt when the .csv file or the measurement
+dictionary changes. Extracts with names that are not in the dictionary are
+not cached, so these names are never lost in the cache.
+"""
+
+import hashlib
+import json
+import os
+import warnings
+import numpy as np
+import pandas as pd
+
+# Created functions
+from measurements import measurement_dtype, measurement_hash
+
+# pyarrow is needed for Parquet files, without pyarrow the cache is stored as
+# pickle file
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Version of the cache, change to rebuild all cached extracts
+cache_version = 3
+
+# Number of rows of a .csv file that are converted at once
+chunksize = 10**6
+
+# Layout of the extracts: column names, columns to drop and column types.
+# Columns of 'dictionaries' are categorical with fixed categories, the same in
+# every chunk and extract.
+extracts = {
+    'lab': {'names': ['Patient ID', 'Measurement', 'Value', 'Unit', 'Time'],
+            'drop': [],
+            'categories': ['Unit'],
+            'dictionaries': {'Measurement': measurement_dtype},
+            'integers': ['Patient ID'],
+            'floats': ['Value'],
+            'dates': {'Time': '%Y-%m-%d %H:%M:%S.%f'}},
+    'patients': {'names': ['Patient ID', 'Gender', 'Admissiondate', 'Cardio',
+                           'OK', 'CPB'],
+                 'drop': [],
+                 'categories': [],
+                 'dictionaries': {},
+                 'integers': [],
+                 'floats': [],
+                 'dates': {'Admissiondate': '%Y-%m-%d %H:%M:%S.%f'}},
+    'birthdate': {'names': ['Patient ID', 'Birthdate'],
+                  'drop': [],
+                  'categories': [],
+                  'dictionaries': {},
+                  'integers': [],
+                  'floats': [],
+                  'dates': {'Birthdate': '%Y-%m-%d %H:%M:%S.%f'}},
+    'pdms': {'names': ['Nr', 'Patient ID', 'Datetime', 'HR', 'RR', 'SpO2', 'SBP',
+                       'DBP', 'MAP', 'Temp1', 'Temp2', 'Temp rect', 'etCO2'],
+             'drop': ['Nr'],
+             'categories': [],
+             'dictionaries': {},
+             'integers': [],
+             'floats': ['HR', 'RR', 'SpO2', 'SBP', 'DBP', 'MAP', 'Temp1',
+                        'Temp2', 'Temp rect', 'etCO2'],
+             'dates': {'Datetime': '%d-%m-%Y %H:%M'}},
+    }
+
+
+def file_hash(path):
+    """Function to calculate the SHA-1 hash of a file, reading 1 MB at once"""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(2**20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def cache_paths(path):
+    """
+    Function to get the names of the cached extract and its description.
+
+    Parameters
+    ----------
+    path : name of .csv file
+
+    Returns
+    -------
+    data : name of columnar file in folder .cache next to the .csv file
+    meta : name of .json file describing the .csv file the cache was built from
+
+    """
+    folder = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+    name = os.path.basename(path)
+    extension = '.parquet' if pyarrow is not None else '.pkl'
+    return (os.path.join(folder, name + extension),
+            os.path.join(folder, name + '.json'))
+
+
+def source_description(path, kind):
+    """
+    Description of the .csv file: size, modification time, layout and hash
+    of the measurement dictionary (the codes of the cached names)
+    """
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'kind': kind,
+            'version': cache_version, 'dictionary': measurement_hash}
+
+
+def cache_valid(path, kind):
+    """
+    Function to check whether the cached extract of a .csv file is up to date.
+    The layout and measurement dictionary must be the same as when the cache
+    was built. The size and modification time of the .csv file are compared
+    first. Only
+    when these differ, the hash of the .csv file is compared, so the cache is
+    not rebuilt for a .csv file that was copied or touched without changes.
+
+    Parameters
+    ----------
+    path : name of .csv file
+    kind : layout of the extract, key of extracts
+
+    Returns
+    -------
+    valid : True if the cache can be used
+
+    """
+    data, meta = cache_paths(path)
+    if not (os.path.exists(data) and os.path.exists(meta)):
+        return False
+
+    with open(meta) as file:
+        cached = json.load(file)
+    current = source_description(path, kind)
+    if any(cached.get(key) != current[key] for key in ('kind', 'version', 'dictionary',
+                                                     'size')):
+        return False
+    if cached.get('mtime_ns') == current['mtime_ns']:
+        return True
+
+    # Modification time changed: compare contents
+    if cached.get('sha1') != file_hash(path):
+        return False
+    cached['mtime_ns'] = current['mtime_ns']
+    with open(meta, 'w') as file:
+        json.dump(cached, file)
+    return True
+
+
+def type_extract(dataframe, kind):
+    """
+    Function to give the columns of an extract their types: categorical
+    measurement names (codes of the measurement dictionary), int32 patient
+    IDs, datetime64 timestamps and float32 values. Names that are not in the
+    dictionary are kept as categories after the dictionary, with a warning
+    (such extracts are not cached, see build_cache). Patient IDs that are
+    empty or do not fit in int32 raise a ValueError.
+
+    Parameters
+    ----------
+    dataframe : DataFrame read from a .csv extract
+    kind : layout of the extract, key of extracts
+
+    Returns
+    -------
+    dataframe : DataFrame with typed columns
+
+    """
+    layout = extracts[kind]
+    dataframe = dataframe.drop(columns=layout['drop'])
+    for column in layout['categories']:
+        dataframe[column] = dataframe[column].astype('category')
+    dataframe = dictionary_columns(dataframe, kind)
+    for column, dtype in layout['dictionaries'].items():
+        unknown = dataframe[column].cat.categories[len(dtype.categories):]
+        if len(unknown) > 0:
+            warnings.warn('%d %s names are not in the dictionary, they are kept '
+                          'but the extract is not cached: %s'
+                          % (len(unknown), column.lower(),
+                             ', '.join(map(str, unknown[:10]))))
+    for column in layout['integers']:
+        numbers = pd.to_numeric(dataframe[column], errors='coerce')
+        limits = np.iinfo(np.int32)
+        invalid = (numbers.isna() | (numbers % 1 != 0) | (numbers < limits.min)
+                   | (numbers > limits.max))
+        if invalid.any():
+            values = dataframe.loc[invalid, column].unique()
+            raise ValueError('%d %s values are empty, not integers or outside '
+                             'the int32 range: %s'
+                             % (invalid.sum(), column.lower(),
+                                ', '.join(map(str, values[:10]))))
+        dataframe[column] = numbers.astype('int32')
+    for column in layout['floats']:
+        dataframe[column] = pd.to_numeric(dataframe[column],
+                                          errors='coerce').astype('float32')
+    for column, date_format in layout['dates'].items():
+        dataframe[column] = pd.to_datetime(dataframe[column], format=date_format)
+    return dataframe
+
+
+def dictionary_columns(dataframe, kind):
+    """
+    Function to give the columns with a fixed dictionary their categories
+    again, e.g. after reading the columnar file (which only keeps the names
+    that occur) or after concatenating chunks. Names that are not in the
+    dictionary are added as categories after the dictionary, so the codes of
+    the dictionary names stay the same.
+    """
+    for column, dtype in extracts[kind]['dictionaries'].items():
+        names = dataframe[column]
+        if names.dtype == dtype:
+            continue
+        unknown = [name for name in pd.unique(names.dropna().astype(object))
+                   if name not in dtype.categories]
+        if len(unknown) > 0:
+            dtype = pd.CategoricalDtype(list(dtype.categories) + unknown)
+        dataframe[column] = names.astype(dtype)
+    return dataframe
+
+
+def in_dictionary(dataframe, kind):
+    """True if all names of the dictionary columns are in their dictionary"""
+    return all(dataframe[column].dtype == dtype
+               for column, dtype in extracts[kind]['dictionaries'].items())
+
+
+def concat_chunks(chunks, kind):
+    """Concatenate typed chunks to one DataFrame with the types of the layout"""
+    if not chunks:
+        return type_extract(pd.DataFrame(columns=extracts[kind]['names']), kind)
+    dataframe = pd.concat(chunks, ignore_index=True)
+    for column in extracts[kind]['categories']:
+        dataframe[column] = dataframe[column].astype('category')
+    return dictionary_columns(dataframe, kind)
+
+
+def read_csv_chunks(path, kind):
+    """Read a .csv extract in typed chunks of chunksize rows"""
+    layout = extracts[kind]
+    with pd.read_csv(path, sep=';', names=layout['names'], index_col=False,
+                     chunksize=chunksize) as reader:
+        for chunk in reader:
+            yield type_extract(chunk, kind)
+
+
+def build_cache(path, kind):
+    """
+    Function to convert a .csv extract to a typed columnar file. The .csv
+    file is converted in chunks, so large extracts do not need to fit in
+    memory as text, and the typed chunks are yielded while converting, so the
+    .csv file is only parsed once. Extracts with names that are not in the
+    measurement dictionary are not cached (the cache stores names as codes of
+    the dictionary), their chunks are only yielded.
+
+    Parameters
+    ----------
+    path : name of .csv file
+    kind : layout of the extract, key of extracts
+
+    Yields
+    ------
+    dataframe : typed DataFrame of at most chunksize rows, see type_extract
+
+    """
+    data, meta = cache_paths(path)
+    os.makedirs(os.path.dirname(data), exist_ok=True)
+    description = source_description(path, kind)
+
+    cached = True
+    chunks = []
+    writer = None
+    try:
+        for chunk in read_csv_chunks(path, kind):
+            cached = cached and in_dictionary(chunk, kind)
+            if cached and pyarrow is not None:
+                table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    # Categories differ per chunk, use the same index type
+                    schema = pyarrow.schema(
+                        [field.with_type(pyarrow.dictionary(pyarrow.int32(),
+                                                            field.type.value_type))
+                         if pyarrow.types.is_dictionary(field.type) else field
+                         for field in table.schema], metadata=table.schema.metadata)
+                    writer = pyarrow.parquet.ParquetWriter(data + '.tmp', schema)
+                writer.write_table(table.cast(schema))
+            elif cached:
+                chunks.append(chunk)
+            yield chunk
+        if not cached:
+            return
+
+        if pyarrow is None:
+            concat_chunks(chunks, kind).to_pickle(data + '.tmp')
+        elif writer is None:
+            # Empty .csv file
+            type_extract(pd.DataFrame(columns=extracts[kind]['names']),
+                         kind).to_parquet(data + '.tmp', index=False)
+        else:
+            writer.close()
+            writer = None
+
+        description['sha1'] = file_hash(path)
+        os.replace(data + '.tmp', data)
+        with open(meta, 'w') as file:
+            json.dump(description, file)
+    finally:
+        # Not cached or not read to the end: remove the partial file
+        if writer is not None:
+            writer.close()
+        if os.path.exists(data + '.tmp'):
+            os.remove(data + '.tmp')
+
+
+def read_extract(path, kind):
+    """
+    Function to load a .csv extract as typed DataFrame, using the columnar
+    cache of the extract if it is up to date. Otherwise the extract is
+    converted once (build_cache), which also gives the DataFrame.
+
+    Parameters
+    ----------
+    path : name of .csv file, e.g. 'Lab_Chemie.csv'
+    kind : layout of the extract: 'lab', 'patients', 'birthdate' or 'pdms'
+
+    Returns
+    -------
+    dataframe : DataFrame with the columns of the extract, categorical
+        measurement names, int32 patient IDs, datetime64 timestamps and
+        float32 values
+
+    """
+    if not cache_valid(path, kind):
+        return concat_chunks(list(build_cache(path, kind)), kind)
+
+    data, _ = cache_paths(path)
+    if pyarrow is not None:
+        dataframe = pd.read_parquet(data)
+    else:
+        dataframe = pd.read_pickle(data)
+
+    return dictionary_columns(dataframe, kind)
+
+
+def read_extract_chunks(path, kind):
+    """
+    Function to load a .csv extract as typed DataFrames of at most chunksize
+    rows, so the whole extract never has to be in memory. The chunks are read
+    from the columnar cache, or while the cache is rebuilt if it is not up to
+    date. Without pyarrow, the .csv file is read in chunks directly.
+
+    Parameters
+    ----------
+    path : name of .csv file, e.g. 'ICKGsepsis.csv'
+    kind : layout of the extract: 'lab', 'patients', 'birthdate' or 'pdms'
+
+    Yields
+    ------
+    dataframe : DataFrame with the columns of the extract, categorical
+        measurement names, int32 patient IDs, datetime64 timestamps and
+        float32 values
+
+    """
+    if pyarrow is None:
+        yield from read_csv_chunks(path, kind)
+        return
+
+    if not cache_valid(path, kind):
+        yield from build_cache(path, kind)
+        return
+
+    data, _ = cache_paths(path)
+    parquet = pyarrow.parquet.ParquetFile(data)
+    for batch in parquet.iter_batches(batch_size=chunksize):
+        yield dictionary_columns(batch.to_pandas(), kind)
@@ -5,91 +5,251 @@ Author: Marit Verboom
 Date: 02/2022 - 05/22
 """
 
+import numpy as np
 import pandas as pd
 
+# Created functions
+from time_index import select_window, window_hours
 
-def feature_table_chemie(dataframe, patient_information, hours):
+# Features per laboratory extract: (feature, [measurement names], aggregation)
+# The aggregation over the first x hours after admittance to the PICU is 
+# either the maximal ('max') or the minimal ('min') value of the feature.
+chemie_features = [
+    ('CRP', ['C-Reaktief Proteïne', 'C-Reactief Proteine'], 'max'),
+    ('Chloride', ['Chloride', 'Chloride (art)', 'Chloride(arterieel)'], 'max'),
+    ('Calcium', ['Calcium', 'Calcium (art)', 'Calcium (arterieel)'], 'max'),
+    ('Magnesium', ['Magnesium', 'Magnesium (art)', 'Magnesium (arterieel)'], 'max'),
+    ('Fosfaat', ['Fosfaat', 'Fosfaat, anorganisch', 'Fosfaat (arterieel)'], 'max'),
+    ('Kreatinine', ['Kreatinine', 'Kreatinine (art)', 'Kreatinine (arterieel)'], 'max'),
+    ('Ureum', ['Ureum', 'Ureum (art)', 'Ureum (arterieel)'], 'max'),
+    ('Albumine', ['Albumine', 'Albumine (art)', 'Albumine (arterieel)'], 'max')]
+
+hematologie_features = [
+    ('Hemoglobine', ['Hemoglobine', 'Hemoglobine (art)', 'Hemoglobine (arterieel)'], 'min'),
+    ('Hematocriet', ['Hematocriet', 'Hematocriet (art)', 'Hematocriet (arterieel)'], 'min'),
+    ('Erytrocyten', ['Erytrocyten', 'Erytrocyten (art)', 'Erytrocyten (arterieel'], 'min'),
+    ('Trombocyten', ['Trombocyten', 'Trombocyten (art)', 'Trombocyten (arterieel)'], 'min'),
+    ('Leukocyten', ['Leukocyten', 'Leukocyten (art)', 'Leukocyten (arterieel)'], 'max'),
+    ('Lymfocyten', ['Lymfocyten', 'Lymfocyten (art)', 'Lymfocyten (arterieel'], 'max')]
+
+bloedgas_features = [
+    ('pH', ['pH', 'pH (art)', 'pH (arterieel)'], 'max'),
+    ('pCO2', ['pCO2', 'pCO2 (art)', 'pCO2 (arterieel)'], 'max'),
+    ('pO2', ['pO2', 'pO2 (art)', 'pO2 (arterieel)'], 'max'),
+    ('sO2', ['sO2', 'sO2 (art)', 'sO2 (arterieel)'], 'max'),
+    ('SpO2', ['SpO2', 'SpO2 (art)', 'SpO2 (arterieel)'], 'max'),
+    ('Natrium', ['Natrium', 'Natrium (art)', 'Natrium (arterieel)'], 'max'),
+    ('Kalium', ['Kalium', 'Kalium (art)', 'Kalium (arterieel)'], 'max'),
+    ('Chloride', ['Chloride', 'Chloride (art)', 'Chloride (arterieel)'], 'max'),
+    ('Glucose', ['Glucose', 'Glucose (art)', 'Glucose (arterieel)'], 'max'),
+    ('Lactaat', ['Lactaat', 'Lactaat (art)', 'Lactaat (arterieel)'], 'max')]
+
+# Extracts in the order of the columns of feature_table
+lab_extracts = [('bloedgas', bloedgas_features), ('chemie', chemie_features),
+                ('hematologie', hematologie_features)]
+
+
+def column_names(extracts):
+    """
+    Column names of the features of several extracts: a feature of more than
+    one extract gets the extract between brackets, e.g. 'Chloride (bloedgas)'
+    and 'Chloride (chemie)', so every column name is unique.
+
+    Parameters
+    ----------
+    extracts : list of (extract, feature_list)
+
+    Returns
+    -------
+    columns : list of column names
+
+    """
+    names = [name for _, feature_list in extracts for name, _, _ in feature_list]
+    return [name + ' (%s)' % extract if names.count(name) > 1 else name
+            for extract, feature_list in extracts for name, _, _ in feature_list]
+
+
+# Column names of feature_table and feature_table_hours
+lab_columns = column_names(lab_extracts)
+
+
+def feature_values(dataframe, feature_list):
+    """
+    Function to map the measurement names of a laboratory DataFrame to the
+    features in feature_list once, dropping measurements of other parameters.
+    Measurement names are categorical (measurements.py), so only the names in
+    the dictionary are looked up and the rows are selected on integer codes.
+
+    Parameters
+    ----------
+    dataframe : DataFrame containing parametervalues per patient ID
+    feature_list : list of (feature, measurement names, aggregation)
+
+    Returns
+    -------
+    values : DataFrame with columns 'Patient ID', 'Feature' (categorical), 
+        'Value' and 'Difference' (hours after admission of 
+        time_index.window_hours, the same as the windows)
+
+    """
+    measurement = dataframe['Measurement']
+    if not isinstance(measurement.dtype, pd.CategoricalDtype):
+        measurement = measurement.astype('category')
+    
+    # Feature number per measurement name (category), so the rows are mapped
+    # with the integer codes. The last entry is for missing names (code -1).
+    numbers = {name: i for i, (_, aliases, _) in enumerate(feature_list)
+               for name in aliases}
+    lookup = np.array([numbers.get(name, -1)
+                       for name in measurement.cat.categories] + [-1],
+                      dtype=np.int16)
+    feature = lookup[measurement.cat.codes.to_numpy()]
+    keep = feature >= 0
     
+    columns = [name for name, _, _ in feature_list]
+    values = pd.DataFrame({'Patient ID': dataframe['Patient ID'].to_numpy()[keep],
+                           'Feature': pd.Categorical.from_codes(feature[keep],
+                                                                columns),
+                           'Value': dataframe['Value'].to_numpy()[keep],
+                           'Difference': np.asarray(window_hours(dataframe))[keep]})
+    return values
+
+
+def aggregate_features(values, groups, feature_list):
+    """
+    Function to take the maximal or minimal value (as defined in feature_list)
+    per feature for every group of measurements.
+
+    Parameters
+    ----------
+    values : DataFrame created by feature_values
+    groups : columns to group on, e.g. ['Patient ID', 'Feature']
+    feature_list : list of (feature, measurement names, aggregation)
+
+    Returns
+    -------
+    grouped : Series with aggregated value per group
+
     """
+    aggregation = {name: agg for name, _, agg in feature_list}
+    grouped = values.groupby(groups, observed=True)['Value'].agg(['max', 'min'])
+    usemax = grouped.index.get_level_values('Feature').map(aggregation) == 'max'
+    grouped = pd.Series(np.where(usemax, grouped['max'], grouped['min']),
+                        index=grouped.index)
+    return grouped
+
+
+def extract_features(dataframe, patient_information, hours, feature_list):
+    """
+    Function to create a DataFrame with one row per patient and one column per
+    feature in feature_list, in one pass over the laboratory measurements.
+
     Parameters
     ----------
     dataframe: DataFrame containing parametervalues per patient ID of measurements during
-    PICU stay, including time of measurement after admittance to the PICU in hours.
+    PICU stay, including time of measurement after admittance to the PICU in hours,
+    or a TimeIndex (time_index.py) on this DataFrame.
     
     patient_information: patientinfo with columns Patient ID, Gender,
     Admissiondate, Cardio, OK, CPB.
         
     hours:  hours after admittance to the PICU for moment of prediction.
+    
+    feature_list: list of (feature, measurement names, aggregation), e.g.
+    chemie_features.
         
     Returns
     -------
-    features: Dataframe containing maximal value per feature in first x hours after admittance to the PICU
+    features: Dataframe containing maximal or minimal value per feature in first x hours after admittance to the PICU
     
     """
+    # Only keep values of first x hours of opname (time_index.py)
+    dataframe = select_window(dataframe, -np.inf, hours, closed='right')
+    values = feature_values(dataframe, feature_list)
+    
+    # Maximal or minimal value per patient and feature
+    grouped = aggregate_features(values, ['Patient ID', 'Feature'],
+                                 feature_list)
+    
+    # Wide table with a row per patient in patient_information
+    columns = [name for name, _, _ in feature_list]
+    features = grouped.unstack('Feature')
+    features = features.reindex(index=patient_information['Patient ID'],
+                                columns=columns)
+    features.columns.name = None
+    features.reset_index(inplace=True)
+    
+    return features
+
+
+def extract_features_hours(dataframe, patient_information, hours,
+                           feature_list):
+    """
+    Function to create the features of extract_features for several moments
+    of prediction at once. Measurements are grouped on the first moment of 
+    prediction at which they are known, after which a running maximum or 
+    minimum over the moments of prediction gives the features per moment.
+
+    Parameters
+    ----------
+    dataframe: DataFrame containing parametervalues per patient ID of measurements during
+    PICU stay, including time of measurement after admittance to the PICU in hours,
+    or a TimeIndex (time_index.py) on this DataFrame.
+    
+    patient_information: patientinfo with columns Patient ID, Gender,
+    Admissiondate, Cardio, OK, CPB.
         
-    dataframe = dataframe
-    
-    # Only keep values of first x hours of opname
-    dataframe = dataframe.loc[dataframe['Difference'] <= hours]
-    dataframe.reset_index(drop=True, inplace=True)
-    
-    # Create DataFrame for features
-    ptid = patient_information['Patient ID']
-    columns = ['Patient ID', 'CRP', 'Chloride', 'Calcium', 'Magnesium',
-               'Fosfaat', 'Kreatinine', 'Ureum', 'Albumine']
-    features = pd.DataFrame(columns=columns)
-    features['Patient ID'] = ptid
-    count = 0
-    
-    for i in ptid:
-        keep = dataframe.loc[dataframe['Patient ID'] == i]
-        
-        # CRP
-        CRP = keep.loc[keep['Measurement'].isin(['C-Reaktief Proteïne', 'C-Reactief Proteine'])]
-        CRP.reset_index(drop=True, inplace=True)
-        features['CRP'][count] = CRP['Value'].max()
-        
-        # Chloride
-        chloride = keep.loc[keep['Measurement'].isin(['Chloride', 'Chloride (art)', 'Chloride(arterieel)'])]
-        chloride.reset_index(drop=True, inplace=True)
-        features['Chloride'][count] = chloride['Value'].max()
-        
-        # Calcium
-        calcium = keep.loc[keep['Measurement'].isin(['Calcium', 'Calcium (art)', 'Calcium (arterieel)'])]
-        calcium.reset_index(drop=True, inplace=True)
-        features['Calcium'][count] = calcium['Value'].max()
-        
-        # Magnesium
-        magnesium = keep.loc[keep['Measurement'].isin(['Magnesium', 'Magnesium (art)', 'Magnesium (arterieel)'])]
-        magnesium.reset_index(drop=True, inplace=True)
-        features['Magnesium'][count] = magnesium['Value'].max()
-        
-        # Fosfaat
-        fosfaat = keep.loc[keep['Measurement'].isin(['Fosfaat', 'Fosfaat, anorganisch', 'Fosfaat (arterieel)'])]
-        fosfaat.reset_index(drop=True, inplace=True)
-        features['Fosfaat'][count] = fosfaat['Value'].max()
-        
-        # Kreatinine
-        kreatinine = keep.loc[keep['Measurement'].isin(['Kreatinine', 'Kreatinine (art)', 'Kreatinine (arterieel)'])]
-        kreatinine.reset_index(drop=True, inplace=True)
-        features['Kreatinine'][count] = kreatinine['Value'].max()
-        
-        # Ureum
-        ureum = keep.loc[keep['Measurement'].isin(['Ureum', 'Ureum (art)', 'Ureum (arterieel)'])]
-        ureum.reset_index(drop=True, inplace=True)
-        features['Ureum'][count] = ureum['Value'].max()
-        
-        #Albumine
-        albumine = keep.loc[keep['Measurement'].isin(['Albumine', 'Albumine (art)', 'Albumine (arterieel)'])]
-        albumine.reset_index(drop=True, inplace=True)
-        features['Albumine'][count] = albumine['Value'].max()
+    hours:  list of hours after admittance to the PICU for moments of prediction.
+    
+    feature_list: list of (feature, measurement names, aggregation), e.g.
+    chemie_features.
         
-        count = count + 1
-            
+    Returns
+    -------
+    features: Dataframe with index (Patient ID, Hours) containing maximal or 
+    minimal value per feature in first x hours after admittance to the PICU
+    
+    """
+    moments = np.sort(np.atleast_1d(hours))
+    
+    # Only keep values of first x hours of opname for the last moment
+    dataframe = select_window(dataframe, -np.inf, moments[-1], closed='right')
+    values = feature_values(dataframe, feature_list)
+    
+    # First moment of prediction at which the measurement is known
+    values['Moment'] = np.searchsorted(moments, values['Difference'].to_numpy(dtype=float))
+    
+    # Maximal or minimal value per patient, feature and moment of prediction
+    grouped = aggregate_features(values, ['Patient ID', 'Feature', 'Moment'],
+                                 feature_list)
+    grouped = grouped.unstack('Moment').reindex(columns=range(len(moments)))
+    
+    # Running maximum or minimum over the moments of prediction, moments 
+    # without new measurements keep the value of the previous moment
+    aggregation = {name: agg for name, _, agg in feature_list}
+    usemax = grouped.index.get_level_values('Feature').map(aggregation) == 'max'
+    grouped.loc[usemax] = grouped.loc[usemax].cummax(axis=1)
+    grouped.loc[~usemax] = grouped.loc[~usemax].cummin(axis=1)
+    grouped = grouped.ffill(axis=1)
+    
+    # Wide table with a row per patient in patient_information per moment:
+    # a row per patient with the features of all moments (reindexed, not
+    # stacked), reshaped to a row per patient and moment
+    columns = [name for name, _, _ in feature_list]
+    grouped = grouped.unstack('Feature')
+    grouped = grouped.reindex(index=patient_information['Patient ID'],
+                              columns=pd.MultiIndex.from_product([range(len(moments)),
+                                                                  columns]))
+    index = pd.MultiIndex.from_product([patient_information['Patient ID'],
+                                        moments], names=['Patient ID', 'Hours'])
+    features = pd.DataFrame(grouped.to_numpy().reshape(-1, len(columns)),
+                            index=index, columns=columns)
+    features.columns.name = None
+    
     return features
 
 
-def feature_table_hematologie(dataframe, patient_information, hours):
+def feature_table_chemie(dataframe, patient_information, hours):
     
     """
     Parameters
@@ -107,61 +267,34 @@ def feature_table_hematologie(dataframe, patient_information, hours):
     features: Dataframe containing maximal value per feature in first x hours after admittance to the PICU
     
     """
-    dataframe = dataframe
-    
-    # Only keep values of first x hours of opname
-    dataframe = dataframe.loc[dataframe['Difference'] <= hours]
-    dataframe.reset_index(drop=True, inplace=True)
-    
-    # Create DataFrame for features
-    ptid = patient_information['Patient ID']
-    columns = ['Patient ID', 'Hemoglobine', 'Hematocriet', 'Erytrocyten', 'Trombocyten',
-               'Leukocyten', 'Lymfocyten']
-    features = pd.DataFrame(columns=columns)
-    features['Patient ID'] = ptid
-    count = 0
+    return extract_features(dataframe, patient_information, hours,
+                            chemie_features)
+
+
+def feature_table_hematologie(dataframe, patient_information, hours):
     
-    #key = ['Hemoglobine', 'Hematocriet', 'Erytrocyten', 'Trombocyten',
-           #'Leukocyten', 'Lymfocyten']
+    """
+    Parameters
+    ----------
+    dataframe: DataFrame containing parametervalues per patient ID of measurements during
+    PICU stay, including time of measurement after admittance to the PICU in hours.
     
-    for i in ptid:
-        keep = dataframe.loc[dataframe['Patient ID'] == i]
-        
-        # Hemoglobine
-        hb  = keep.loc[keep['Measurement'].isin(['Hemoglobine', 'Hemoglobine (art)', 'Hemoglobine (arterieel)'])]
-        hb.reset_index(drop=True, inplace = True)
-        features['Hemoglobine'][count] = hb['Value'].min()
-        
-        # Hematocriet
-        hema  = keep.loc[keep['Measurement'].isin(['Hematocriet', 'Hematocriet (art)', 'Hematocriet (arterieel)'])]
-        hema.reset_index(drop=True, inplace = True)
-        features['Hematocriet'][count] = hema['Value'].min()
-        
-        # Erytrocyten
-        ery = keep.loc[keep['Measurement'].isin(['Erytrocyten', 'Erytrocyten (art)', 'Erytrocyten (arterieel'])]
-        ery.reset_index(drop=True, inplace=True)
-        features['Erytrocyten'][count] = ery['Value'].min()
-        
-        # Trombocyten
-        trombo = keep.loc[keep['Measurement'].isin(['Trombocyten', 'Trombocyten (art)', 'Trombocyten (arterieel)'])]
-        trombo.reset_index(drop=True, inplace=True)
-        features['Trombocyten'][count] = trombo['Value'].min()
-        
-        # Leukocyten
-        leuko = keep.loc[keep['Measurement'].isin(['Leukocyten', 'Leukocyten (art)', 'Leukocyten (arterieel)'])]
-        leuko.reset_index(drop=True, inplace=True)
-        features['Leukocyten'][count] = leuko['Value'].max()
+    patient_information: patientinfo with columns Patient ID, Gender,
+    Admissiondate, Cardio, OK, CPB.
         
-        # Lymfocyten
-        lymfo = keep.loc[keep['Measurement'].isin(['Lymfocyten', 'Lymfocyten (art)', 'Lymfocyten (arterieel'])]
-        lymfo.reset_index(drop=True, inplace=True)
-        features['Lymfocyten'][count] = lymfo['Value'].max()
-                
-        count = count + 1
+    hours:  hours after admittance to the PICU for moment of prediction.
         
-    return features
+    Returns
+    -------
+    features: Dataframe containing minimal or maximal value per feature in first x hours after admittance to the PICU
+    
+    """
+    return extract_features(dataframe, patient_information, hours,
+                            hematologie_features)
+
 
 def feature_table_bloedgas(dataframe, patient_information, hours):
+    
     """
     Parameters
     ----------
@@ -178,79 +311,9 @@ def feature_table_bloedgas(dataframe, patient_information, hours):
     features: Dataframe containing maximal value per feature in first x hours after admittance to the PICU
     
     """
-    dataframe = dataframe
-    
-    # Only keep values of first x hours of opname
-    dataframe = dataframe.loc[dataframe['Difference'] <= hours]
-    dataframe.reset_index(drop=True, inplace=True)
-    
-    # Create DataFrame for features
-    ptid = patient_information['Patient ID']
-    columns = ['Patient ID', 'pH', 'pCO2', 'pO2', 
-               'sO2', 'SpO2', 'Natrium', 'Kalium', 'Chloride',
-               'Glucose', 'Lactaat']
-    features = pd.DataFrame(columns=columns)
-    features['Patient ID'] = ptid
-    
-    count = 0
-       
-    for i in ptid:
-        keep = dataframe.loc[dataframe['Patient ID'] == i]
-        
-        # pH
-        pH = keep.loc[keep['Measurement'].isin(['pH', 'pH (art)', 'pH (arterieel)'])]
-        pH.reset_index(drop=True, inplace=True)
-        features['pH'][count] = pH['Value'].max()
-        
-        # pCO2
-        pCO2 = keep.loc[keep['Measurement'].isin(['pCO2', 'pCO2 (art)', 'pCO2 (arterieel)'])]
-        pCO2.reset_index(drop=True, inplace=True)
-        features['pCO2'][count] = pCO2['Value'].max()
-        
-        # pO2
-        pO2 = keep.loc[keep['Measurement'].isin(['pO2', 'pO2 (art)', 'pO2 (arterieel)'])]
-        pO2.reset_index(drop=True, inplace=True)
-        features['pO2'][count] = pO2['Value'].max()
-        
-        # sO2
-        sO2 = keep.loc[keep['Measurement'].isin(['sO2', 'sO2 (art)', 'sO2 (arterieel)'])]
-        sO2.reset_index(drop=True, inplace=True)
-        features['sO2'][count] = sO2['Value'].max()
-        
-        # SpO2
-        SpO2 = keep.loc[keep['Measurement'].isin(['SpO2', 'SpO2 (art)', 'SpO2 (arterieel)'])]
-        SpO2.reset_index(drop=True, inplace=True)
-        features['SpO2'][count] = SpO2['Value'].max()
-        
-        
-        # Natrium
-        Natrium = keep.loc[keep['Measurement'].isin(['Natrium', 'Natrium (art)', 'Natrium (arterieel)'])]
-        Natrium.reset_index(drop=True, inplace=True)
-        features['Natrium'][count] = Natrium['Value'].max()
-        
-        # Kalium
-        Kalium = keep.loc[keep['Measurement'].isin(['Kalium', 'Kalium (art)', 'Kalium (arterieel)'])]
-        Kalium.reset_index(drop=True, inplace=True)
-        features['Kalium'][count] = Kalium['Value'].max()
-        
-        # Chloride
-        Chloride = keep.loc[keep['Measurement'].isin(['Chloride', 'Chloride (art)', 'Chloride (arterieel)'])]
-        Chloride.reset_index(drop=True, inplace=True)
-        features['Chloride'][count] = Chloride['Value'].max()
-        
-        # Glucose
-        Glucose = keep.loc[keep['Measurement'].isin(['Glucose', 'Glucose (art)', 'Glucose (arterieel)'])]
-        Glucose.reset_index(drop=True, inplace=True)
-        features['Glucose'][count] = Glucose['Value'].max()
-        
-        # Lactaat
-        Lactaat = keep.loc[keep['Measurement'].isin(['Lactaat', 'Lactaat (art)', 'Lactaat (arterieel)'])]
-        Glucose.reset_index(drop=True, inplace=True)
-        features['Lactaat'][count] = Lactaat['Value'].max()
-        
-        count = count + 1
-        
-    return features  
+    return extract_features(dataframe, patient_information, hours,
+                            bloedgas_features)
+
 
 def feature_table(labchem, labhemat, labbloedgas, patient_information, hours):
     """
@@ -262,13 +325,15 @@ def feature_table(labchem, labhemat, labbloedgas, patient_information, hours):
     labchem : DataFrame with  laboratory chem parameters per patient
     labhemat : DataFrame containing laboratory hemat parameters per patient
     labbloedgas : DataFrame containing laboratory bloodgas parameters per patient
+        (labchem, labhemat and labbloedgas can also be a TimeIndex, see 
+        time_index.as_timeindex, so the index is built once per DataFrame)
     patient_information : DataFrame containing patient information
     hours : hours after admittance to the PICU for moment of prediction
     
     Returns
     -------
     features : DataFrame containing all laboratory parameters per patient at 
-        moment of prediciton.
+        moment of prediciton, with the columns lab_columns.
 
     """
     
@@ -282,8 +347,48 @@ def feature_table(labchem, labhemat, labbloedgas, patient_information, hours):
     labchem = labchem.set_index('Patient ID')
     labhemat = labhemat.set_index('Patient ID')  
     
-    # Add dataframes together
+    # Add dataframes together, with unique names for features of more than
+    # one extract
     dfx = pd.concat([labbloedgas, labchem], axis = 1)
     features = pd.concat([dfx, labhemat], axis=1)
+    features.columns = lab_columns
               
     return features
+
+
+def feature_table_hours(labchem, labhemat, labbloedgas, patient_information,
+                        hours):
+    """
+    Function to create a DataFame of all laboratory parameters per patient for
+    several moments of prediction, with one pass over each DataFrame.
+
+    Parameters
+    ----------
+    labchem : DataFrame with  laboratory chem parameters per patient
+    labhemat : DataFrame containing laboratory hemat parameters per patient
+    labbloedgas : DataFrame containing laboratory bloodgas parameters per patient
+        (labchem, labhemat and labbloedgas can also be a TimeIndex, see 
+        time_index.as_timeindex, so the index is built once per DataFrame)
+    patient_information : DataFrame containing patient information
+    hours : list of hours after admittance to the PICU for moments of 
+        prediction
+    
+    Returns
+    -------
+    features : DataFrame with index (Patient ID, Hours) containing all 
+        laboratory parameters per patient per moment of prediction, with the
+        same columns as feature_table.
+
+    """
+    labbloedgas = extract_features_hours(labbloedgas, patient_information,
+                                         hours, bloedgas_features)
+    labchem = extract_features_hours(labchem, patient_information, hours,
+                                     chemie_features)
+    labhemat = extract_features_hours(labhemat, patient_information, hours,
+                                      hematologie_features)
+    
+    # Add dataframes together
+    features = pd.concat([labbloedgas, labchem, labhemat], axis=1)
+    features.columns = lab_columns
+    
+    return features
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Load test of scoring_service.py against a stand-in model trained on synthetic
+data (benchmarks.py), so no patient data is needed. The service is started as
+a separate process and several clients send micro-batches of raw rows at the
+same time. Run as a script to print the latency, e.g. python load_test.py
+"""
+
+# Import modules
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+# Created functions
+from benchmarks import (synthetic_patients, synthetic_labs, synthetic_vitals,
+                        measurement_names)
+from lab_features import chemie_features, hematologie_features, bloedgas_features
+from ingest import type_extract
+from score_patients import patient_features
+from train_model import export_model
+from parallel import core_budget
+from random_forest_opt import search_fits
+
+
+def synthetic_tables(n_patients, hours, seed=0):
+    """
+    Function to create raw rows of patients, laboratory and PDMS data with the
+    layout of the extracts.
+
+    Returns
+    -------
+    tables : dict with a DataFrame per request key of scoring_service.py
+
+    """
+    patient_information = synthetic_patients(n_patients, seed)
+    patient_information['Patient ID'] += seed*n_patients
+    tables = {'patients': patient_information}
+    for i, (key, feature_list) in enumerate([('lab_chemie', chemie_features),
+                                             ('lab_hematologie', hematologie_features),
+                                             ('lab_bloedgas', bloedgas_features)]):
+        tables[key] = synthetic_labs(patient_information, 30,
+                                     measurement_names(feature_list), seed + i)
+    tables['vitals'] = synthetic_vitals(patient_information, hours, seed)
+    return tables
+
+
+def standin_model(path, n_patients=100, hours=12, seed=0):
+    """
+    Function to train and save a stand-in model on synthetic patients with
+    random labels, with the same features as the real model.
+
+    Returns
+    -------
+    artifact : saved model, see train_model.export_model
+
+    """
+    tables = synthetic_tables(n_patients, hours, seed)
+    features = patient_features(type_extract(tables['lab_chemie'], 'lab'),
+                                type_extract(tables['lab_hematologie'], 'lab'),
+                                type_extract(tables['lab_bloedgas'], 'lab'),
+                                type_extract(tables['vitals'], 'pdms'),
+                                type_extract(tables['patients'], 'patients'),
+                                hours)
+    features = features.dropna(axis=1, how='all')
+    features['Label'] = np.random.default_rng(seed).integers(0, 2, len(features))
+    return export_model(features, path, hours, core_budget(1, n_fits=search_fits('oob')),
+                         seed, 'oob')
+
+
+def synthetic_requests(n_requests, batch, hours):
+    """Requests (JSON lines) with batch patients each"""
+    requests = []
+    for seed in range(1, n_requests + 1):
+        tables = synthetic_tables(batch, hours, seed)
+        request = {key: json.loads(table.to_json(orient='records'))
+                   for key, table in tables.items()}
+        requests.append(json.dumps(request).encode() + b'\n')
+    return requests
+
+
+async def client(port, requests, latencies):
+    """Send the requests one after another over one connection"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port,
+                                                   limit=2**26)
+    for request in requests:
+        start = time.perf_counter()
+        writer.write(request)
+        await writer.drain()
+        response = json.loads(await reader.readline())
+        latencies.append(time.perf_counter() - start)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run_clients(port, requests, n_requests, concurrency):
+    """Run concurrency clients that send n_requests requests in total"""
+    latencies = []
+    per_client = [[requests[i % len(requests)]
+                   for i in range(c, n_requests, concurrency)]
+                  for c in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*[client(port, batch, latencies) for batch in per_client])
+    return np.array(latencies), time.perf_counter() - start
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=120):
+    """Wait until the service accepts connections"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError('scoring service did not start on port %d' % port)
+
+
+def load_test(n_requests=200, concurrency=4, batch=5, hours=12):
+    """
+    Function to start the scoring service with a stand-in model and measure
+    the latency of n_requests requests of batch patients.
+
+    Returns
+    -------
+    results : dict with number of requests and patients, p50 and p99 latency
+        in ms and throughput in requests and patients per second
+
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'standin.joblib')
+        standin_model(path, hours=hours)
+        requests = synthetic_requests(min(n_requests, 20), batch, hours)
+
+        port = free_port()
+        service = subprocess.Popen([sys.executable,
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 'scoring_service.py'),
+                                    '--model', path, '--port', str(port)])
+        try:
+            wait_for_port(port)
+            latencies, seconds = asyncio.run(run_clients(port, requests,
+                                                         n_requests, concurrency))
+        finally:
+            service.terminate()
+            service.wait()
+
+    results = {'Requests': n_requests,
+               'Patients': n_requests*batch,
+               'p50 (ms)': 1000*np.percentile(latencies, 50),
+               'p99 (ms)': 1000*np.percentile(latencies, 99),
+               'Requests/s': n_requests/seconds,
+               'Patients/s': n_requests*batch/seconds}
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the scoring '
+                                     'service with a stand-in model')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--batch', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, value in load_test(args.requests, args.concurrency, args.batch).items():
+        print('%-12s %10.1f' % (name, value))
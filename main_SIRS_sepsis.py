@@ -19,30 +19,41 @@ from main_preprocessing import main_preprocessing
 from ROCcurves import ROC_mean
 from rf_cv import rf_cv 
 from bar_plots import bar_plots
+from parallel import core_budget, budget_report
+from random_forest_opt import search_fits
 
 #%% Pipeline6
 
-# Preprocessing
-features_cleaned, patients_sirs, sirs_crit = main_preprocessing('patients.csv', 12)
+# The folds of rf_cv run in worker processes, which import this file
+if __name__ == '__main__':
+    # Preprocessing
+    features_cleaned, patients_sirs, sirs_crit = main_preprocessing('patients.csv', 12)
 
-# manually add labels based on EPD
-labels = pd.read_csv('labels.csv', sep = ';', names = ['Patient ID', 'Label'],
-                     index_col=False)
+    # manually add labels based on EPD
+    labels = pd.read_csv('labels.csv', sep = ';', names = ['Patient ID', 'Label'],
+                         index_col=False)
 
-# add labels (random until labels are known), 0: SIRS○, 1: Sepsis
-features_cleaned['Label'] = labels['Label']
+    # add labels (random until labels are known), 0: SIRS○, 1: Sepsis
+    features_cleaned['Label'] = labels['Label']
 
-# Random Forest with 5-fold cross validation
-score, sens, spec, tprs, aucs, important_features = rf_cv(features_cleaned)
+    # Division of the cores over folds, search and trees (None: all cores)
+    search = 'randomized'
+    budget = core_budget(n_cores=None, n_fits=search_fits(search))
+    print(budget_report(budget))
 
-# ROC curve
-ROC_mean(tprs, aucs, 'ROC')
+    # Random Forest with 5-fold cross validation
+    score, sens, spec, tprs, aucs, important_features = rf_cv(features_cleaned,
+                                                              budget,
+                                                              search=search)
 
-# Score
-mean_auc = np.mean(aucs)
-mean_acc = np.mean(score)
-mean_sens = np.mean(sens)
-mean_spec = np.mean(spec)
+    # ROC curve
+    ROC_mean(tprs, aucs, 'ROC')
 
-# Plot feature importance score
-bar_plots(important_features, title='')
+    # Score
+    mean_auc = np.mean(aucs)
+    mean_acc = np.mean(score)
+    mean_sens = np.mean(sens)
+    mean_spec = np.mean(spec)
+
+    # Plot feature importance score
+    bar_plots(important_features, title='')
@@ -5,57 +5,48 @@ Author: Marit Verboom
 Date: 02/2022 - 05/2022
 """
 # Load modules
+import numpy as np
 import pandas as pd
 
 # Load created functions
+from ingest import read_extract
 from time_after_surgery import time_after_surgery
-from lab_features import feature_table
+from lab_features import feature_table, feature_table_hours
+from time_index import as_timeindex
 from cleaning import lab_cleaning
 from pdmsdata import mean_vitals
 from SIRScriteria import sirs_table, sirs_criteria
 
 
-def main_preprocessing(patientinfo, hours):
-    
-    
+def load_data(patientinfo):
     """
-    Function for the preprocessing of laboratory data and vital parameters 
-    derived from eiter LUMC dataplaform or PDMS.
+    Function to load patient information and laboratory parameters and to add
+    the time after admission to the laboratory parameters.
 
     Parameters
     ----------
     patientinfo : Name of .csv file containing patientinfo with columns Patient
         ID, Gender, Admissiondate, Cardio, OK, CPB.
-    hours : hours after admission to the PICU for moment of prediction. 
 
     Returns
     -------
-    features_cleaned: DataFrame containing all feature values per patient ID 
-        after preprocessing
-    patients_sirs: DataFrame containing all patient IDs of patients that meet
-        SIRS criteria 
+    patient_information : DataFrame containing patient information of 
+        patients with CPB
+    lab_chemie, lab_bloedgas, lab_hematologie : DataFrames containing 
+        parametervalues per patient ID of measurements during PICU stay, 
+        including time of measurement after admittance to the PICU in hours.
 
     """
-
     # Load patient information
-    patient_information = pd.read_csv(patientinfo, sep = ';',
-                                      names = ['Patient ID', 'Gender',
-                                               'Admissiondate', 'Cardio', 'OK',
-                                               'CPB'], index_col=False)
+    patient_information = read_extract(patientinfo, 'patients')
     # Keep patients with CPB
     patient_information = patient_information.loc[patient_information['CPB'] == 1] 
     patient_information.reset_index(drop=True, inplace=True)
     
     # Load laboratory parameters 
-    lab_hematologie = pd.read_csv('Lab_Hematologie.csv', sep = ';',
-                                  names = ['Patient ID', 'Measurement',
-                                           'Value' , 'Unit', 'Time'])
-    lab_bloedgas = pd.read_csv('Lab_Bloedgas.csv',  sep = ';',
-                               names = ['Patient ID', 'Measurement', 'Value' ,
-                                        'Unit', 'Time'])
-    lab_chemie = pd.read_csv('Lab_Chemie.csv',  sep = ';',
-                             names = ['Patient ID', 'Measurement', 'Value' ,
-                                      'Unit', 'Time'])
+    lab_hematologie = read_extract('Lab_Hematologie.csv', 'lab')
+    lab_bloedgas = read_extract('Lab_Bloedgas.csv', 'lab')
+    lab_chemie = read_extract('Lab_Chemie.csv', 'lab')
     
     
     # Create dataframes containing only patients with patient ID in 
@@ -64,14 +55,46 @@ def main_preprocessing(patientinfo, hours):
     lab_bloedgas = time_after_surgery(lab_bloedgas, patient_information)
     lab_hematologie = time_after_surgery(lab_hematologie, patient_information)
     
+    return patient_information, lab_chemie, lab_bloedgas, lab_hematologie
+
+
+def main_preprocessing(patientinfo, hours):
+    
+    
+    """
+    Function for the preprocessing of laboratory data and vital parameters 
+    derived from eiter LUMC dataplaform or PDMS.
+
+    Parameters
+    ----------
+    patientinfo : Name of .csv file containing patientinfo with columns Patient
+        ID, Gender, Admissiondate, Cardio, OK, CPB.
+    hours : hours after admission to the PICU for moment of prediction. 
+
+    Returns
+    -------
+    features_cleaned: DataFrame containing all feature values per patient ID 
+        after preprocessing
+    patients_sirs: DataFrame containing all patient IDs of patients that meet
+        SIRS criteria 
+
+    """
+
+    # Load patient information and laboratory parameters, including time 
+    # after surgery
+    patient_information, lab_chemie, lab_bloedgas, lab_hematologie = load_data(patientinfo)
     
     # Import and preprocessing of vital parameters from PDMS (pdmsdata.py)
     features_vitals, medianvitals = mean_vitals('ICKGsepsis.csv',
                                                 'patients.csv', hours)
 
-     
+    # Index on time after admission per laboratory DataFrame, built once and
+    # used by the feature builders (time_index.py)
+    index_chemie, index_hematologie, index_bloedgas = [
+        as_timeindex(lab) for lab in (lab_chemie, lab_hematologie, lab_bloedgas)]
+    
     # Create featuretable for moment of prediction (lab_features.py)
-    features_lab = feature_table(lab_chemie, lab_hematologie, lab_bloedgas,
+    features_lab = feature_table(index_chemie, index_hematologie, index_bloedgas,
                                  patient_information, hours)
     features_lab.reset_index(inplace=True)
     
@@ -103,3 +126,96 @@ def main_preprocessing(patientinfo, hours):
         
     return features_cleaned, patients_sirs, sirs
 
+
+def main_preprocessing_hours(patientinfo, hours):
+    """
+    Function for the preprocessing of laboratory data and vital parameters
+    for several moments of prediction in one pass. The data is loaded and 
+    prepared once and the features of every moment of prediction are derived
+    from running maxima/minima (laboratory) and 10-minute medians (vitals).
+
+    Parameters
+    ----------
+    patientinfo : Name of .csv file containing patientinfo with columns Patient
+        ID, Gender, Admissiondate, Cardio, OK, CPB.
+    hours : list of hours after admission to the PICU for moments of 
+        prediction, e.g. range(2, 25)
+
+    Returns
+    -------
+    features : DataFrame with index (Patient ID, Hours) containing all feature
+        values per patient per moment of prediction (patient x hours x 
+        feature cube, see feature_cube), for patients that meet SIRS criteria.
+        Features are not cleaned, lab_cleaning can be applied per moment of
+        prediction.
+    patients_sirs: DataFrame containing all patient IDs of patients that meet
+        SIRS criteria 
+    sirs : DataFrame with SIRS scoring per patient
+
+    """
+    moments = list(hours)
+    
+    # Load patient information and laboratory parameters, including time 
+    # after surgery
+    patient_information, lab_chemie, lab_bloedgas, lab_hematologie = load_data(patientinfo)
+    
+    # Vital parameters from PDMS for all moments of prediction (pdmsdata.py)
+    features_vitals, medianvitals = mean_vitals('ICKGsepsis.csv',
+                                                'patients.csv', moments)
+    
+    # Index on time after admission per laboratory DataFrame, built once and
+    # used by the feature builders (time_index.py)
+    index_chemie, index_hematologie, index_bloedgas = [
+        as_timeindex(lab) for lab in (lab_chemie, lab_hematologie, lab_bloedgas)]
+    
+    # Laboratory features for all moments of prediction (lab_features.py)
+    features_lab = feature_table_hours(index_chemie, index_hematologie,
+                                       index_bloedgas, patient_information,
+                                       moments)
+    features_lab.reset_index(inplace=True)
+    
+    # SIRS criteria do not depend on moment of prediction (SIRScriteria.py)
+    sirstable = sirs_table(medianvitals, lab_hematologie, patient_information)
+    sirs, patients_sirs = sirs_criteria(sirstable)
+    
+    # Add vital parameters and features_lab together for patients with data
+    # in features_vitals at the moment of prediction
+    features = pd.merge(features_lab, features_vitals, on=['Patient ID', 'Hours'],
+                        how='inner')
+    
+    # Patients with SIRS that have features
+    patients_sirs = patients_sirs.loc[patients_sirs['Patient ID'].isin(features['Patient ID'])]
+    patients_sirs = patients_sirs.sort_values(by=['Patient ID'])
+    patients_sirs.reset_index(drop=True, inplace=True)
+    
+    # Complete patient x hours grid for patients with sirs
+    index = pd.MultiIndex.from_product([patients_sirs['Patient ID'], moments],
+                                       names=['Patient ID', 'Hours'])
+    features = features.set_index(['Patient ID', 'Hours']).reindex(index)
+    
+    return features, patients_sirs, sirs
+
+
+def feature_cube(features):
+    """
+    Function to convert the output of main_preprocessing_hours to a NumPy 
+    array.
+
+    Parameters
+    ----------
+    features : DataFrame with index (Patient ID, Hours), complete and sorted
+        on patient ID
+
+    Returns
+    -------
+    cube : array (patients x hours x features)
+    patients : patient IDs along the first axis
+    hours : hours along the second axis
+
+    """
+    patients = features.index.get_level_values('Patient ID').unique()
+    hours = features.index.get_level_values('Hours').unique()
+    cube = features.to_numpy(dtype=np.float64)
+    cube = cube.reshape(len(patients), len(hours), features.shape[1])
+    
+    return cube, patients, hours
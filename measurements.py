@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Dictionary of laboratory measurement names, generated from the catalogue
+observationdatabase.csv (one name per row, ';' separated with quoted fields).
+Every name gets a small integer code: the 'Measurement' column of the lab
+extracts is a categorical with these names as categories (int16 codes, see
+ingest.py), so the same name has the same code in every extract and chunk, and
+selecting features compares integers instead of strings. Names of the feature
+lists (lab_features.py) and names selected by the queries of the lab extracts
+(Lab_*.sql) that are not in the catalogue are added after the catalogue, so no
+feature is lost and the extracts can be cached. Every name also has an analyte code: the name
+without the specimen between brackets, e.g. 'Chloride (arterieel)' ->
+'Chloride'. Analytes are compared without case, since the catalogue spells
+the same analyte in several ways (e.g. 'PH' and 'pH', 'PO2' and 'pO2').
+"""
+
+import glob
+import hashlib
+import os
+import re
+import numpy as np
+import pandas as pd
+
+# Created functions
+from lab_features import chemie_features, hematologie_features, bloedgas_features
+
+# Catalogue of observation names and queries of the lab extracts, next to
+# this file
+folder = os.path.dirname(os.path.abspath(__file__))
+catalogue_path = os.path.join(folder, 'observationdatabase.csv')
+query_paths = sorted(glob.glob(os.path.join(folder, 'Lab_*.sql')))
+
+
+def read_catalogue(path=catalogue_path):
+    """
+    Function to read the names of the observation catalogue, in order of the
+    file and without duplicates. The catalogue has one column without header;
+    names with ';' or '"' are quoted, so the file is read as ';' separated
+    .csv file (names are kept as written, also trailing spaces in quotes).
+
+    Returns
+    -------
+    names : list of measurement names
+
+    """
+    catalogue = pd.read_csv(path, sep=';', header=None, dtype=str, encoding='utf-8-sig',
+                            keep_default_na=False)
+    if catalogue.shape[1] != 1:
+        raise ValueError('%s should have one column of names, found %d columns'
+                         % (path, catalogue.shape[1]))
+    return list(dict.fromkeys(name for name in catalogue[0] if name))
+
+
+def read_query_names(paths=query_paths):
+    """
+    Function to read the measurement names that the queries of the lab
+    extracts select (code_display_original = '...'), in order of the files.
+    The queries are UTF-8 or Windows-1252 (Lab_Chemie.sql).
+
+    Returns
+    -------
+    names : list of measurement names
+
+    """
+    names = []
+    for path in paths:
+        with open(path, 'rb') as file:
+            query = file.read()
+        try:
+            query = query.decode('utf-8')
+        except UnicodeDecodeError:
+            query = query.decode('cp1252')
+        names += re.findall(r"\[code_display_original\]\s*=\s*'([^']*)'", query)
+    return list(dict.fromkeys(names))
+
+
+def analyte_name(name):
+    """
+    Name of the analyte: the measurement name without the specimen between
+    brackets at the end, e.g. 'pH (art)' -> 'pH'. Brackets with digits, ':' or
+    ';' are part of the name, e.g. times 'Cortisol (09:00)' or 'PML-RARa
+    t(15;17)'.
+    """
+    return re.sub(r'\s*\([^\W\d_][^()\d:;]*\)\s*$', '', name) or name
+
+
+# Measurement names: catalogue, names of the feature lists and of the queries
+feature_names = [name for feature_list in (bloedgas_features, chemie_features,
+                                           hematologie_features)
+                 for _, aliases, _ in feature_list for name in aliases]
+query_names = read_query_names()
+measurement_names = list(dict.fromkeys(read_catalogue() + feature_names
+                                       + query_names))
+measurement_dtype = pd.CategoricalDtype(measurement_names)
+# Hash of the dictionary, to recognise caches with other codes (ingest.py)
+measurement_hash = hashlib.sha1('\n'.join(measurement_names).encode('utf-8')).hexdigest()
+
+# Analyte code per measurement code, names without case are the same analyte;
+# the analyte name is the first spelling in the dictionary
+analyte_index = {}
+analyte_names = []
+for name in measurement_names:
+    if analyte_name(name).casefold() not in analyte_index:
+        analyte_index[analyte_name(name).casefold()] = len(analyte_names)
+        analyte_names.append(analyte_name(name))
+analyte_codes = np.array([analyte_index[analyte_name(name).casefold()]
+                          for name in measurement_names], dtype=np.int16)
+
+
+def measurement_codes(column):
+    """
+    Function to get the code of every measurement name, -1 for names that are
+    not in the dictionary.
+
+    Parameters
+    ----------
+    column : Series with measurement names (strings or categorical)
+
+    Returns
+    -------
+    codes : int16 array with the code per row
+
+    """
+    if column.dtype != measurement_dtype:
+        column = column.astype(measurement_dtype)
+    return column.cat.codes.to_numpy().astype(np.int16, copy=False)
+
+
+def analytes(column):
+    """
+    Function to get the analyte code of every measurement name (index of
+    analyte_names), -1 for names that are not in the dictionary.
+    """
+    codes = measurement_codes(column)
+    return np.where(codes >= 0, analyte_codes[codes], -1).astype(np.int16)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Division of the cores of the machine over the nested levels of the model
+training: the folds of rf_cv (processes), the candidates of the randomized
+search (processes per fold) and the trees of the Random Forest (threads per
+candidate). The product of the levels never exceeds the number of cores, and
+BLAS (numpy, used by IterativeImputer) gets one thread per worker, so the
+levels do not oversubscribe the machine.
+"""
+
+import os
+
+
+def core_budget(n_cores=None, n_folds=5, n_fits=50):
+    """
+    Function to divide the cores over the folds, the search and the trees.
+    Outer levels get cores first, because their tasks are independent and of
+    equal size.
+
+    Parameters
+    ----------
+    n_cores : number of cores to use, None for all cores of the machine
+    n_folds : number of folds of the cross validation (rf_cv)
+    n_fits : number of fits of the search per fold that can run at the same
+        time, depends on the search mode (random_forest_opt.search_fits, 10
+        candidates x 5 inner folds for RandomizedSearchCV). The cores of a
+        fold that the search cannot use go to the trees of the forest.
+
+    Returns
+    -------
+    budget : dict with the number of cores ('cores') and the number of jobs
+        per level: 'folds', 'search', 'trees' and 'blas'
+
+    """
+    if n_cores is None:
+        n_cores = os.cpu_count() or 1
+    if n_cores < 1:
+        raise ValueError('n_cores should be at least 1, not %r' % (n_cores,))
+
+    folds = min(n_folds, n_cores)
+    per_fold = n_cores // folds
+    search = min(n_fits, per_fold)
+    # Cores of the fold that the search cannot use build the trees
+    trees = per_fold // search
+
+    budget = {'cores': n_cores, 'folds': folds, 'search': search,
+              'trees': trees, 'blas': 1}
+    return budget
+
+
+def budget_report(budget):
+    """Description of the division of the cores, e.g. to print"""
+    used = budget['folds']*budget['search']*budget['trees']
+    return ('%d cores: %d folds x %d search jobs x %d tree threads = %d '
+            'workers, %d BLAS thread per worker'
+            % (budget['cores'], budget['folds'], budget['search'],
+               budget['trees'], used, budget['blas']))
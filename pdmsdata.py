@@ -7,20 +7,32 @@ Date: 02/2022 - 05/22
 
 import pandas as pd
 import datetime
+import warnings
 from time_after_surgery import admissiondate 
+from ingest import read_extract, read_extract_chunks, concat_chunks
+from time_index import TimeIndex
+from rolling_median import grouped_median
 import numpy as np
 
+# Vital parameters from PDMS that are used as features
+parameters = ['HR', 'RR', 'Temp rect', 'SpO2', 'SBP', 'DBP', 'MAP', 'Temp1',
+              'etCO2']
 
-def vitalsigns_pdms(vitals, patient_information):
+
+def vitalsigns_pdms(vitals, patient_information, hours=24):
     """
     Function to load .csv file containing vital parameters of all patients that 
     were once admitted to the PICU of the LUMC for the duration of their entire
-    PICU stay. 
+    PICU stay. The file is processed in chunks and only the data of the 
+    included patients is kept, so memory use depends on the size of the 
+    cohort instead of the entire PDMS history.
     
     Parameters
     ----------
     vitals: name of .csv file, 'ICKGsepsis.csv'
     patient_information: .csv file containing patient information, 'patients.csv'
+    hours: number of hours after admission to keep, based on time of 
+        measurement
     
     Returns
     -------
@@ -28,78 +40,94 @@ def vitalsigns_pdms(vitals, patient_information):
         24 hours of their stay
     patient_information: DataFrame containing patient information
     """
-    # Load PDMS Data
-    pdms_data = pd.read_csv(vitals, sep = ';', 
-                            names = ['Nr', 'Patient ID', 'Datetime','HR', 'RR',
-                                     'SpO2', 'SBP', 'DBP', 'MAP', 'Temp1',
-                                     'Temp2', 'Temp rect', 'etCO2' ],
-                            index_col=False)
-    pdms_data = pdms_data.drop(columns='Nr')
-
     # keep all patients with CPB = 1 in patient_information
-    patient_information = pd.read_csv(patient_information, sep = ';', 
-                                      names = ['Patient ID', 'Gender',
-                                               'Admissiondate', 'Cardio', 'OK',
-                                               'CPB'], index_col=False)
+    patient_information = read_extract(patient_information, 'patients')
     patient_information = patient_information.loc[patient_information['CPB'] == 1] 
     patient_information.reset_index(drop=True, inplace=True)
+    
+    patientsfirst24hours = []
+    
+    # Load PDMS Data per chunk
+    for dataframekeep in read_extract_chunks(vitals, 'pdms'):
+        # Keep data of patients that are in patient_information
+        dataframekeep = dataframekeep.loc[dataframekeep['Patient ID'].isin(patient_information['Patient ID'])]
+        
+        # Only keep data between 2019-07-21 - 2020-07-31 and entire 2021
+        # Patients included in current study are selected between these timewindows
+        first = ((dataframekeep['Datetime'] > datetime.datetime(2019, 7, 21)) &
+                 (dataframekeep['Datetime'] < datetime.datetime(2020, 7, 31)))
+        second = ((dataframekeep['Datetime'] > datetime.datetime(2020, 12, 31)) &
+                  (dataframekeep['Datetime'] < datetime.datetime(2022, 1, 1)))
+        dataframekeep = dataframekeep.loc[first | second].reset_index(drop=True)
+        
+        # Admissiondate and first hours of admission
+        patientsfirst24hours.append(vitals_admission(dataframekeep,
+                                                     patient_information, hours))
+    
+    # An empty extract has no chunks, keep the columns of the PDMS data
+    if not patientsfirst24hours:
+        dataframekeep = concat_chunks([], 'pdms').astype(
+            {'Patient ID': patient_information['Patient ID'].dtype})
+        patientsfirst24hours.append(vitals_admission(dataframekeep,
+                                                     patient_information, hours))
+    
+    patientsfirst24hours = pd.concat(patientsfirst24hours, ignore_index=True)
+    
+    return patientsfirst24hours, patient_information
 
-    # Keep data of patients that are in patient_information
-    dataframekeep = pdms_data['Patient ID'].isin(patient_information['Patient ID'])
-    dataframekeep = pdms_data[dataframekeep]
-    dataframekeep.reset_index(drop=True, inplace=True)
-
-    # Only keep data between 2019-07-21 - 2020-07-31 and entire 2021
-    # Patients included in current study are selected between these timewindows
-    dataframekeep['Datetime'] = pd.to_datetime(dataframekeep['Datetime'],
-                                               format = '%d-%m-%Y %H:%M')
-    dataframekeepfirst = dataframekeep.loc[(dataframekeep['Datetime'] >
-                                            datetime.datetime(2019, 7, 21)) &
-                                           (dataframekeep['Datetime'] <
-                                            datetime.datetime(2020, 7, 31))]
-    dataframekeepsecond = dataframekeep.loc[(dataframekeep['Datetime'] >
-                                             datetime.datetime(2020, 12, 31)) &
-                                            (dataframekeep['Datetime'] <
-                                             datetime.datetime(2022, 1, 1))]
-    dataframekeep = dataframekeepfirst.append(dataframekeepsecond)
-    dataframekeep.reset_index(drop=True, inplace=True)
 
-    # Add admissiondate to dataframe (time_after_surgery.py)
-    pdms_dataframe_admission = admissiondate(dataframekeep, patient_information)
+def vitals_admission(dataframe, patient_information, hours=24):
+    """
+    Function to keep the PDMS data of the first hours of admission and add
+    the admissiondate.
+
+    Parameters
+    ----------
+    dataframe : DataFrame containing PDMS data (columns of ICKGsepsis.csv)
+    patient_information : DataFrame containing patient information
+    hours : number of hours after admission to keep
 
-    # During admission (time_after_surgery.py)
-    dataframeadmission = pdms_dataframe_admission.loc[(pdms_dataframe_admission['Datetime'] >
-                                                       pdms_dataframe_admission['Admissiondate'] )]
+    Returns
+    -------
+    dataframeadmission : DataFrame containing the data during the first hours
+        of admission, including column 'Admissiondate'
+
+    """
+    # Add admissiondate to dataframe (time_after_surgery.py)
+    dataframe = admissiondate(dataframe, patient_information)
     
-    # Keep first 24h of data per patient = 24 * 60 = 1140 rows per patient
-    patientsfirst24hours = dataframeadmission.groupby('Patient ID').head(1140)  
-    patientsfirst24hours.reset_index(drop=True, inplace=True)
+    # During admission and first 24h of data per patient, based on time
+    # of measurement after admission (missing minutes in PDMS do not 
+    # change the time window)
+    difference = dataframe['Datetime'] - dataframe['Admissiondate']
+    dataframeadmission = dataframe.loc[(difference > datetime.timedelta(0)) &
+                                       (difference < datetime.timedelta(hours=hours))]
     
-    return patientsfirst24hours, patient_information
+    return dataframeadmission
 
 
-def vitals_postsurgery(vitalsigns, hours):
+def vitals_timeindex(vitalsigns):
     """
-    Function that creates DataFrame containing data for x hours post-surgery.
-
+    Function to create an index on the time after admission of the PDMS data,
+    so time windows can be selected per patient without a scan of all data.
+    
     Parameters
     ----------
     vitalsigns : DataFrame containing all data per patient of the first
-        24 hours of their stay
-    hours : hours after surgery of moment of prediction
-
+        24 hours of their stay, or a TimeIndex created by this function
+    
     Returns
     -------
-    meanvitals : DataFrame containing mean of vitals at moment of prediction
-        per patient.
+    index : TimeIndex (time_index.py) on the vital parameters, with column 
+        'Difference' containing the time of measurement after admission
 
     """
-    parameters = ['HR', 'RR', 'Temp rect', 'SpO2', 'SBP', 'DBP', 'MAP', 'Temp1',
-                  'etCO2']
+    if isinstance(vitalsigns, TimeIndex):
+        return vitalsigns
     
     vitals_all = vitalsigns[['Patient ID', 'Datetime', 'Admissiondate', 'HR',
                              'RR', 'Temp rect', 'SpO2', 'SBP', 'DBP', 'MAP',
-                             'Temp1', 'etCO2']] 
+                             'Temp1', 'etCO2']].copy()
     
     # Convert admissiondate to datetime format
     vitals_all['Admissiondate'] = pd.to_datetime(vitals_all['Admissiondate'],
@@ -107,44 +135,120 @@ def vitals_postsurgery(vitalsigns, hours):
     
     # Calculate difference between moment of measurement and admissiondate
     vitals_all['Difference'] = vitals_all['Datetime'] - vitals_all['Admissiondate']
-
-    # Keep data of timewindow 2 hours before moment of prediction until moment
-    # of prediction
-    parameterhours = vitals_all.loc[(vitals_all['Difference'] >
-                                     datetime.timedelta(hours=hours-2)) & 
-                                    (vitals_all['Difference'] <
-                                     datetime.timedelta(hours=hours))]
     
-    # All patient IDs that are unique 
-    patidunique = parameterhours['Patient ID'].unique()
+    return TimeIndex(vitals_all, vitals_all['Difference'])
+
+
+def vitals_postsurgery(vitalsigns, hours):
+    """
+    Function that creates DataFrame containing data for x hours post-surgery.
+    A list of hours can be given to calculate the vitals for several moments
+    of prediction with one scan of the data.
+
+    Parameters
+    ----------
+    vitalsigns : DataFrame containing all data per patient of the first
+        24 hours of their stay, or TimeIndex created by vitals_timeindex
+    hours : hours after surgery of moment of prediction, or list of hours
+
+    Returns
+    -------
+    meanvitals : DataFrame containing mean of vitals at moment of prediction
+        per patient. For a list of hours, one row per patient per moment of 
+        prediction with an extra column 'Hours'.
+
+    """
+    # Index on time after admission
+    index = vitals_timeindex(vitalsigns)
+
+    # Median per 10 minutes from 2 hours before the first moment of 
+    # prediction until the last moment of prediction, for all patients and
+    # parameters at once
+    moments = np.atleast_1d(hours)
+    if moments.size == 0:
+        # No moments of prediction, no rows
+        return pd.DataFrame(columns=['Patient ID', 'Hours'] + parameters)
+    start = moments.min() - 2
+    parameterhours = index.window(start, moments.max(), closed='neither')
+    patidunique, medians, samples = median_per_10min(parameterhours, start,
+                                                     moments.max())
     
-    # Create new DataFrame with a row per patient    
-    meanvitals = pd.DataFrame(patidunique, columns = ['Patient ID'])
-       
-    # For every vital parameter    
-    for i in parameters: 
-        meanvitals[i] = ''
-        meanvital = []  
-        # for every patient              
-        for ptid in patidunique:
-            # keep part of dataframe with data for patient
-            keep = parameterhours.loc[parameterhours['Patient ID'] == ptid]
-            keep.reset_index(drop=True, inplace=True)
-            # create empty list for median of parameters
-            med = []
-            # For every 10 samples (=10 min), take median of the parameter
-            # 2 hours of data, per 10 minutes = 120 minutes max
-            for j in range(0, 120, 10):
-                median = keep[i][j:j+9].median()
-                med.append(median)
-            # take mean of all median values and ignore NaN values    
-            meanvital.append(np.nanmean(med)) 
+    meanvitals = []
+    for moment in moments:
+        # Timewindow 2 hours before moment of prediction until moment of 
+        # prediction, 2 hours of data, per 10 minutes = 12 windows
+        first = int(round((moment - 2 - start)*6))
+        window = slice(first, first + 12)
         
-        for k in range(len(meanvital)):
-            meanvitals[i][k] = meanvital[k]
+        # take mean of all median values and ignore NaN values, for patients
+        # with data in the timewindow
+        present = samples[:, window].sum(axis=1) > 0
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            meanvital = np.nanmean(medians[present, window], axis=1)
+        
+        meanvital = pd.DataFrame(meanvital, columns=parameters)
+        meanvital.insert(0, 'Patient ID', patidunique[present])
+        if np.ndim(hours) > 0:
+            meanvital.insert(1, 'Hours', moment)
+        meanvitals.append(meanvital)
+    
+    meanvitals = pd.concat(meanvitals, ignore_index=True)
         
     return meanvitals
     
+
+def median_per_10min(vitalsigns, start, end):
+    """
+    Function to calculate the median parameter value per 10 minutes per 
+    patient. The windows are based on the time of measurement after admission
+    (minute 0-9, 10-19, ... after start), so gaps in the PDMS data do not shift
+    the windows. All rows count in the median, also several rows of a patient
+    in the same minute.
+
+    Parameters
+    ----------
+    vitalsigns : DataFrame containing vital parameters per patient, including
+        column 'Difference' with time of measurement after admission
+    start : start of the first window in hours after admission
+    end : end of the last window in hours after admission
+
+    Returns
+    -------
+    patidunique : sorted patient IDs with data between start and end
+    medians : array (patients x windows x parameters) containing median 
+        parameter value per 10 minutes
+    samples : array (patients x windows) containing number of measurements per
+        10 minutes
+
+    """
+    n_windows = int(round((end - start)*6))
+    
+    # Minute of measurement after start of first window
+    minutes = vitalsigns['Difference'] // pd.Timedelta(minutes=1)
+    minutes = minutes.to_numpy(dtype=float) - start*60
+    keep = (minutes >= 0) & (minutes < n_windows*10)
+    minutes = minutes[keep].astype(np.int64)
+    
+    # Row per patient and window per 10 minutes
+    patidunique, patient = np.unique(vitalsigns['Patient ID'].to_numpy()[keep],
+                                     return_inverse=True)
+    window = minutes // 10
+    samples = np.bincount(patient*n_windows + window,
+                          minlength=len(patidunique)*n_windows)
+    samples = samples.reshape(len(patidunique), n_windows)
+    
+    # Median over the rows of every patient and window, ignoring NaN values,
+    # so rows with the same patient and minute (duplicates in the PDMS data)
+    # all count (windows without any measurement stay NaN)
+    values = vitalsigns[parameters].to_numpy(dtype=float)[keep]
+    medians = grouped_median(values, patient*n_windows + window,
+                             len(patidunique)*n_windows)
+    medians = medians.reshape(len(patidunique), n_windows, len(parameters))
+    
+    return patidunique, medians, samples
+
+
 def all_vitals(vitalsigns, patient_information):
     """
     Function to calculate median parameter value per 10 minutes of data for 
@@ -154,74 +258,32 @@ def all_vitals(vitalsigns, patient_information):
     Parameters
     ----------
     vitalsigns : DataFrame containing all data per patient of the first
-        24 hours of their stay
+        24 hours of their stay, or TimeIndex created by vitals_timeindex
     patient_information : patient_information: DataFrame containing patientinfo
     
     Returns
     -------
     medianvitals : DataFrame containing  median parameter value per 10 minutes
-        per patient
+        per patient, 'Min' is the end of the 10 minutes in minutes after 
+        admission
 
     """
-    parameters = ['HR', 'RR', 'Temp rect', 'SpO2', 'SBP', 'DBP', 'MAP',
-                  'Temp1', 'etCO2']
-    
-    vitals_all = vitalsigns[['Patient ID', 'Datetime', 'Admissiondate', 'HR',
-                             'RR', 'Temp rect', 'SpO2', 'SBP', 'DBP', 'MAP', 
-                             'Temp1', 'etCO2']] 
+    # Keep data between 1 and 24 hours after admission
+    index = vitals_timeindex(vitalsigns)
+    parameterhours = index.window(1, 24, closed='neither')
     
-    # Convert admissiondate to datetime format
-    vitals_all['Admissiondate'] = pd.to_datetime(vitals_all['Admissiondate'],
-                                                 format = '%Y-%m-%d %H:%M:%S.%f')
-    vitals_all['Difference'] = vitals_all['Datetime'] - vitals_all['Admissiondate']
-    
-    # Calculate difference between moment of measurement and admissiondate
-    parameterhours = vitals_all.loc[(vitals_all['Difference'] >
-                                     datetime.timedelta(hours=1)) &
-                                    (vitals_all['Difference'] <
-                                     datetime.timedelta(hours=24))]
-    
-    # All patient IDs that are unique and sort in ascending number
-    patidunique = parameterhours['Patient ID'].unique()
-    patidunique = np.sort(patidunique) 
-    
-    # Create new DataFrame with 144 rows per patient
+    # Median per 10 minutes for every patient (sorted on patient ID)
     # 24 hours, with 6 times 10 minutes per hour, 6 * 24 = 144
-    medianvitals = pd.DataFrame(patidunique, columns = ['Patient ID'])
-    medianvitals = pd.concat([medianvitals]*144, ignore_index=True)
-    # Creating empty column for minute value
-    medianvitals['Min'] = ''
-    
-    # initial count
-    count = 0
-    # for every 10 minutes in 24 hours, fill in minute values 
-    for i in range(10, 1450, 10): #1450; 24 hours
-        medianvitals['Min'][count:(count+len(patidunique))] = i
-        count = count + len(patidunique)  
+    patidunique, medians, _ = median_per_10min(parameterhours, 0, 24)
     
-    # Sort DataFrame on patient ID and ascending minutes of stay
-    medianvitals = medianvitals.sort_values(['Patient ID', 'Min'], ascending = (True, True))
-    medianvitals.reset_index(drop=True, inplace=True)
-              
-    # For every vital parameter  
-    for i in parameters: 
-        medianvitals[i] = ''
-        # inital count
-        count = 0
-        # for every patient
-        for ptid in patidunique:
-            # keep parameters of patient
-            keep = parameterhours.loc[parameterhours['Patient ID'] == ptid]
-            keep.reset_index(drop=True, inplace=True)
-            med = []
-            # For every 10 samples (=10 min), take median HR
-            for j in range(0, 1440, 10):
-                median = keep[i][j:j+9].median()
-                med.append(median)
-            # add 144 median values of patient to DataFrame    
-            medianvitals[i][count:(count+144)] = med
-            # modify count to new patient
-            count = count + 144
+    # Create new DataFrame with 144 rows per patient, sorted on patient ID and
+    # ascending minutes of stay
+    medianvitals = pd.DataFrame({'Patient ID': np.repeat(patidunique, 144),
+                                 'Min': np.tile(np.arange(10, 1450, 10),
+                                                len(patidunique))})
+    medians = pd.DataFrame(medians.reshape(-1, len(parameters)),
+                           columns=parameters)
+    medianvitals = pd.concat([medianvitals, medians], axis=1)
         
     return medianvitals
   
@@ -232,7 +294,7 @@ def mean_vitals(vitals, patient_information, hours):
     ----------
     vitals: name of .csv file, 'ICKGsepsis.csv'
     patient_information: .csv file containing patient information, 'patients.csv'
-    hours : hours after surgery of moment of prediction
+    hours : hours after surgery of moment of prediction, or list of hours
 
     Returns
     -------
@@ -245,6 +307,8 @@ def mean_vitals(vitals, patient_information, hours):
     
     # Use created functions
     vitalsigns, patient_information = vitalsigns_pdms(vitals, patient_information)
+    # Index on time after admission, shared by both functions
+    vitalsigns = vitals_timeindex(vitalsigns)
     meanvitals = vitals_postsurgery(vitalsigns, hours) 
     medianvitals = all_vitals(vitalsigns, patient_information)
     
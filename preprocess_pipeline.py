@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Preprocessing of the feature table before the Random Forest: imputation,
+scaling and parameter selection in one scikit-learn Pipeline. The pipeline is
+fit once on the trainset; the testset and new patients are only transformed,
+so they are imputed, scaled and selected based on the trainset. A fitted
+pipeline can be saved to and loaded from a file with joblib.
+"""
+
+# Import modules
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.experimental import enable_iterative_imputer
+from sklearn.impute import IterativeImputer
+from sklearn.preprocessing import RobustScaler
+from sklearn.feature_selection import SelectPercentile, f_classif
+from sklearn.pipeline import Pipeline
+
+# Columns of the feature table that are not parameters of the model
+non_parameters = ['Patient ID', 'Label']
+
+
+def parameters_labels(features):
+    """
+    Function to split the feature table in the parameters and the labels. The
+    patient ID is not a parameter, so cross validation (rf_cv.py) and the
+    exported model (train_model.py) use the same parameters.
+
+    Parameters
+    ----------
+    features : DataFrame containing parameters per patient and column 'Label'
+
+    Returns
+    -------
+    X : DataFrame containing the parameters
+    y : array containing the labels
+
+    """
+    y = np.array(features['Label'])
+    X = features.drop(columns=[column for column in non_parameters
+                               if column in features.columns])
+    return X, y
+
+
+def preprocessing_pipeline(percentile=90):
+    """
+    Function to create the preprocessing pipeline: IterativeImputer
+    (cleaning.py), RobustScaler (scaling.py) and SelectPercentile with an
+    ANOVA f-test (selection.py).
+
+    Parameters
+    ----------
+    percentile : percentage of features to keep
+
+    Returns
+    -------
+    pipeline : unfitted Pipeline
+
+    """
+    pipeline = Pipeline([('imputer', IterativeImputer(random_state=42)),
+                         ('scaler', RobustScaler()),
+                         ('selection', SelectPercentile(f_classif,
+                                                        percentile=percentile))])
+    return pipeline
+
+
+def selected_features(pipeline, columns):
+    """
+    Function to get the features kept by a fitted pipeline, in the order of the
+    columns of the transformed data.
+
+    Parameters
+    ----------
+    pipeline : fitted Pipeline from preprocessing_pipeline
+    columns : column names of the data the pipeline was fit on
+
+    Returns
+    -------
+    features : DataFrame with columns 'Specs' and 'Scores' (ANOVA f-value) of
+        the selected features, indexed by column number in the original data
+
+    """
+    selection = pipeline.named_steps['selection']
+    support = np.flatnonzero(selection.get_support())
+    features = pd.DataFrame({'Specs': np.asarray(columns)[support],
+                             'Scores': selection.scores_[support]},
+                            index=support)
+    return features
+
+
+def save_pipeline(pipeline, path):
+    """Function to save a fitted pipeline (or model) to a file"""
+    joblib.dump(pipeline, path)
+
+
+def load_pipeline(path):
+    """Function to load a fitted pipeline (or model) saved with save_pipeline"""
+    return joblib.load(path)
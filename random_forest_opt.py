@@ -5,14 +5,325 @@ Date: 02/2022 - 05/22
 """
 
 # Import modules
-from sklearn.model_selection import RandomizedSearchCV
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.experimental import enable_halving_search_cv
+from sklearn.model_selection import (RandomizedSearchCV, ParameterSampler,
+                                     StratifiedKFold, HalvingRandomSearchCV)
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import confusion_matrix
 
 # Created functions
 from feature_importance_RF import feature_importance_RF
 
-def random_forest_opt(data_train, data_test, labels_train, labels_test, features):
+# Define hyperparameters for RF
+# Multiple parameters can be optimized, see 
+# https://scikit-learn.org/stable/modules/generated/sklearn.ensemble.RandomForestClassifier.html
+forest_parameters = {'n_estimators': list(range(100,300))}
+
+# Number of sampled candidates and inner folds (defaults of RandomizedSearchCV)
+n_candidates = 10
+n_inner = 5
+
+# Hyperparameters for successive halving, the number of trees is the resource
+# that grows per rung (min_samples_leaf at least 2, see random_forest_opt)
+halving_parameters = {'max_depth': [None, 3, 5, 8, 12],
+                      'max_features': ['sqrt', 'log2', 0.5, None],
+                      'min_samples_leaf': [2, 3, 5, 8],
+                      'class_weight': [None, 'balanced', 'balanced_subsample'],
+                      'criterion': ['gini', 'entropy']}
+# Number of trees in the first and last rung, and the factor between rungs
+halving_trees = (10, 300)
+halving_factor = 3
+
+
+def search_fits(search):
+    """
+    Number of fits of a search mode (see random_forest_opt) that can run at
+    the same time, for parallel.core_budget: candidates times inner folds for
+    'randomized', the inner folds for 'warm_start', one forest for 'oob' and
+    the configurations of the first rung times inner folds for 'halving'.
+    """
+    fits = {'randomized': n_candidates*n_inner,
+            'warm_start': n_inner,
+            'oob': 1,
+            'halving': halving_trees[1] // halving_trees[0]*n_inner}
+    if search not in fits:
+        raise ValueError("search should be 'randomized', 'warm_start', 'oob' "
+                         "or 'halving', not %r" % (search,))
+    return fits[search]
+
+
+def forest_candidates(random_state):
+    """Numbers of trees sampled by RandomizedSearchCV with random_state"""
+    sampler = ParameterSampler(forest_parameters, n_candidates,
+                               random_state=random_state)
+    return [parameters['n_estimators'] for parameters in sampler]
+
+
+def grow_forest_scores(forest, data_train, labels_train, data_val, labels_val,
+                       n_estimators):
+    """
+    Function to grow one forest with warm_start through the numbers of trees
+    in n_estimators (smallest first) and score it after every step. With a
+    fixed random_state, the first n trees are the same as those of a new
+    forest of n trees.
+
+    Returns
+    -------
+    scores : accuracy on the validation set per value of n_estimators
+
+    """
+    forest = clone(forest).set_params(warm_start=True)
+    scores = {}
+    for n in sorted(set(n_estimators)):
+        forest.set_params(n_estimators=n)
+        forest.fit(data_train, labels_train)
+        scores[n] = forest.score(data_val, labels_val)
+    return [scores[n] for n in n_estimators]
+
+
+def warm_start_search(forest, data_train, labels_train, random_state,
+                      n_jobs=None):
+    """
+    Function to select n_estimators with the candidates and inner 5-fold CV of
+    RandomizedSearchCV, growing one forest per inner fold instead of one
+    forest per candidate.
+
+    Parameters
+    ----------
+    forest : RandomForestClassifier to tune
+    data_train : parameters of trainset
+    labels_train : labels of trainset
+    random_state : seed of the candidates
+    n_jobs : number of inner folds that are run at the same time
+
+    Returns
+    -------
+    best : selected number of trees
+    candidates : sampled numbers of trees
+    scores : mean inner-CV accuracy per candidate
+
+    """
+    data_train = np.asarray(data_train)
+    labels_train = np.asarray(labels_train)
+    candidates = forest_candidates(random_state)
+    
+    inner = StratifiedKFold(n_inner)
+    scores = Parallel(n_jobs=n_jobs)(
+        delayed(grow_forest_scores)(forest, data_train[train], labels_train[train],
+                                    data_train[val], labels_train[val], candidates)
+        for train, val in inner.split(data_train, labels_train))
+    scores = np.mean(scores, axis=0)
+    
+    # First candidate with the highest score, as in RandomizedSearchCV
+    best = candidates[int(np.argmax(scores))]
+    
+    return best, candidates, scores
+
+
+def oob_search(forest, data_train, labels_train, random_state):
+    """
+    Function to select n_estimators with the out-of-bag accuracy of one
+    forest on the whole trainset, grown with warm_start through the
+    candidates of RandomizedSearchCV. No inner CV is needed.
+
+    Parameters
+    ----------
+    forest : RandomForestClassifier to tune (with bootstrap)
+    data_train : parameters of trainset
+    labels_train : labels of trainset
+    random_state : seed of the candidates
+
+    Returns
+    -------
+    best : selected number of trees
+    candidates : sampled numbers of trees
+    scores : out-of-bag accuracy per candidate
+    forest : the grown forest, with the trees of the largest candidate (see
+        truncate_forest)
+
+    """
+    candidates = forest_candidates(random_state)
+    forest = clone(forest).set_params(warm_start=True, oob_score=True)
+    
+    oob = {}
+    for n in sorted(set(candidates)):
+        forest.set_params(n_estimators=n)
+        forest.fit(data_train, labels_train)
+        oob[n] = forest.oob_score_
+    scores = np.array([oob[n] for n in candidates])
+    
+    # First candidate with the highest score, as in RandomizedSearchCV
+    best = candidates[int(np.argmax(scores))]
+    
+    return best, candidates, scores, forest
+
+
+def truncate_forest(forest, n_estimators):
+    """
+    Function to keep the first n_estimators trees of a forest grown with
+    warm_start. With a fixed random_state these are the same trees as those
+    of a new forest of n_estimators trees, so no second fit is needed. The
+    out-of-bag results of the grown forest are removed.
+
+    Returns
+    -------
+    forest : the same forest with n_estimators trees
+
+    """
+    forest.estimators_ = forest.estimators_[:n_estimators]
+    forest.set_params(n_estimators=n_estimators, warm_start=False,
+                      oob_score=False)
+    for attribute in ('oob_score_', 'oob_decision_function_'):
+        if hasattr(forest, attribute):
+            delattr(forest, attribute)
+    return forest
+
+
+def compare_oob_cv(data_train, labels_train, random_state=None, search_jobs=None,
+                   tree_jobs=None):
+    """
+    Function to compare the selection of n_estimators on out-of-bag accuracy
+    with the selection on inner-CV accuracy, for the same candidates.
+
+    Returns
+    -------
+    scores : DataFrame with per candidate 'n_estimators', 'CV' and 'OOB'
+        accuracy
+    summary : dict with the selected number of trees per method ('CV choice',
+        'OOB choice'), whether they agree, the CV accuracy of both choices and
+        the mean absolute difference between CV and OOB accuracy
+
+    """
+    forest = RandomForestClassifier(min_samples_leaf=2, random_state=random_state,
+                                    n_jobs=tree_jobs)
+    cv_best, candidates, cv_scores = warm_start_search(forest, data_train,
+                                                       labels_train, random_state,
+                                                       search_jobs)
+    oob_best, _, oob_scores, _ = oob_search(forest, data_train, labels_train,
+                                            random_state)
+    
+    scores = pd.DataFrame({'n_estimators': candidates, 'CV': cv_scores,
+                           'OOB': oob_scores})
+    summary = {'CV choice': cv_best,
+               'OOB choice': oob_best,
+               'Agree': cv_best == oob_best,
+               'CV score of CV choice': cv_scores[candidates.index(cv_best)],
+               'CV score of OOB choice': cv_scores[candidates.index(oob_best)],
+               'Mean absolute difference': np.mean(np.abs(cv_scores - oob_scores))}
+    
+    return scores, summary
+
+
+def halving_search(forest, data_train, labels_train, random_state,
+                   n_jobs=None):
+    """
+    Function for a successive halving search over halving_parameters. Many
+    configurations start with few trees, after every rung only the best third
+    continues with three times as many trees.
+    https://scikit-learn.org/stable/modules/grid_search.html#successive-halving-user-guide
+
+    Parameters
+    ----------
+    forest : RandomForestClassifier to tune
+    data_train : parameters of trainset
+    labels_train : labels of trainset
+    random_state : seed of the sampled configurations
+    n_jobs : number of fits that are run at the same time
+
+    Returns
+    -------
+    opti : fitted HalvingRandomSearchCV
+    report : DataFrame with per rung the number of configurations, trees per
+        forest and the time spent on fitting and scoring in seconds
+
+    """
+    opti = HalvingRandomSearchCV(forest, halving_parameters,
+                                 resource='n_estimators',
+                                 min_resources=halving_trees[0],
+                                 max_resources=halving_trees[1],
+                                 factor=halving_factor, cv=n_inner,
+                                 random_state=random_state, n_jobs=n_jobs)
+    opti.fit(data_train, labels_train)
+    
+    results = pd.DataFrame(opti.cv_results_)
+    results['Seconds'] = (results['mean_fit_time'] + results['mean_score_time'])*n_inner
+    report = results.groupby('iter').agg(Configurations=('Seconds', 'size'),
+                                         Trees=('n_resources', 'first'),
+                                         Seconds=('Seconds', 'sum'))
+    report.index.name = 'Rung'
+    
+    return opti, report
+
+
+def optimise_forest(data_train, labels_train, random_state=None,
+                    search_jobs=None, tree_jobs=None, search='randomized'):
+    """
+    Function to select the hyperparameters of the Random Forest and train the
+    selected forest on the whole trainset.
+
+    Parameters
+    ----------
+    data_train : parameters of trainset
+    labels_train : labels of trainset
+    random_state, search_jobs, tree_jobs, search : see random_forest_opt
+
+    Returns
+    -------
+    randomf : optimalised Random Forest classifier
+    report : DataFrame with the time per rung of successive halving (see 
+        halving_search), None for the other search modes. The report is
+        returned instead of printed, as the folds of rf_cv run in parallel.
+
+    """
+    report = None
+    
+    # min_samples_leaf set at 2 so at least 2 patients per endpoint remain
+    forest = RandomForestClassifier(min_samples_leaf=2, random_state=random_state,
+                                    n_jobs=tree_jobs)
+    
+    if search == 'randomized':
+        # Perform Randomized Search with CV for hyperparameter optimalisation
+        #https://scikit-learn.org/stable/modules/generated/sklearn.model_selection.RandomizedSearchCV.html 
+        opti = RandomizedSearchCV(forest, forest_parameters,
+                                  n_iter=n_candidates, cv=n_inner,
+                                  random_state=random_state, n_jobs=search_jobs)
+                
+        # fit optimalisator on train data
+        opti.fit(data_train, labels_train)
+        # best random forest
+        randomf = opti.best_estimator_
+    elif search == 'warm_start':
+        best, _, _ = warm_start_search(forest, data_train, labels_train,
+                                       random_state, search_jobs)
+        # best random forest, trained on the whole trainset
+        randomf = clone(forest).set_params(n_estimators=best)
+        randomf.fit(data_train, labels_train)
+    elif search == 'oob':
+        best, _, _, grown = oob_search(forest, data_train, labels_train,
+                                       random_state)
+        # best random forest: the first best trees of the out-of-bag forest,
+        # which are the trees of a new forest of best trees
+        randomf = truncate_forest(grown, best)
+    elif search == 'halving':
+        opti, report = halving_search(forest, data_train, labels_train,
+                                      random_state, search_jobs)
+        # best random forest, trained on the whole trainset with the trees of
+        # the last rung
+        randomf = opti.best_estimator_
+    else:
+        raise ValueError("search should be 'randomized', 'warm_start', 'oob' "
+                         "or 'halving', not %r" % (search,))
+    
+    return randomf, report
+
+
+def random_forest_opt(data_train, data_test, labels_train, labels_test, features,
+                      random_state=None, search_jobs=None, tree_jobs=None,
+                      search='randomized'):
     """
     Function for the basic optimalization of the Random Forest model. 
 
@@ -23,6 +334,15 @@ def random_forest_opt(data_train, data_test, labels_train, labels_test, features
     labels_train : DataFrame containing labels of trainset
     labels_test : DataFrame containing labels of testset
     features : DataFrame containing  featurenames
+    random_state : seed of the randomized search and the Random Forest, None
+        for a different result every run
+    search_jobs : number of processes of the randomized search
+    tree_jobs : number of threads to build the trees of one Random Forest
+    search : 'randomized' for RandomizedSearchCV, 'warm_start' to grow one
+        forest per inner fold (same candidates and selection, see
+        warm_start_search) or 'oob' to select on out-of-bag accuracy without
+        inner CV (see oob_search) or 'halving' for successive halving over
+        more hyperparameters (see halving_search)
 
     Returns
     -------
@@ -31,26 +351,16 @@ def random_forest_opt(data_train, data_test, labels_train, labels_test, features
     sens_test : sensitivity of RF classifier
     spec_test : specificity of RF classifier
     features : DataFrame containing parameters and their importance
+    report : time per rung of successive halving, None for the other search
+        modes (see optimise_forest)
 
     """
     features = features.sort_index()
     features = features.reset_index(drop=True)  
     
-   
-    # Define hyperparameters for RF
-    # Multiple parameters can be optimized, see 
-    # https://scikit-learn.org/stable/modules/generated/sklearn.ensemble.RandomForestClassifier.html
-    forest_parameters = {'n_estimators': list(range(100,300))}
-        
-    # Perform Randomized Search with CV for hyperparameter optimalisation
-    # min_samples_leaf set at 2 so at least 2 patients per endpoint remain
-    #https://scikit-learn.org/stable/modules/generated/sklearn.model_selection.RandomizedSearchCV.html 
-    opti = RandomizedSearchCV(RandomForestClassifier(min_samples_leaf=2), forest_parameters)
-            
-    # fit optimalisator on train data
-    opti.fit(data_train, labels_train)
-    # best random forest
-    randomf = opti.best_estimator_
+    # Optimalised Random Forest, trained on the whole trainset
+    randomf, report = optimise_forest(data_train, labels_train, random_state,
+                                      search_jobs, tree_jobs, search)
     
     # apply to testset
     y_pred = randomf.predict(data_test)
@@ -60,7 +370,7 @@ def random_forest_opt(data_train, data_test, labels_train, labels_test, features
     score_test = randomf.score(data_test,labels_test)
     
     # DataFrame: importance of the features
-    features = feature_importance_RF(randomf, features['Specs'])
+    features = feature_importance_RF(randomf, features['Specs'], tree_jobs)
     features = features.reset_index(drop=True)    
     
-    return randomf, score_test, sens_test, spec_test, features
\ No newline at end of file
+    return randomf, score_test, sens_test, spec_test, features, report
\ No newline at end of file
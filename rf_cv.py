@@ -5,23 +5,136 @@ Author: Marit Verboom
 Date: 02/2022 - 05/22
 """
 # Import modules
+from concurrent.futures import ProcessPoolExecutor
+from threadpoolctl import threadpool_limits
 import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 from sklearn import model_selection
 
 # Created functions
-from cleaning import lab_imputation
-from selection import selection
-from random_forest_opt import random_forest_opt
+from preprocess_pipeline import (preprocessing_pipeline, selected_features,
+                                 parameters_labels)
+from random_forest_opt import random_forest_opt, compare_oob_cv, search_fits
 from ROCcurves import ROC_all
+from parallel import core_budget
 
 #%%
 
-def rf_cv(features):    
-    # Label (y) and parameters (X)
-    y = features['Label']
-    X = features.drop(columns=['Label'])
+def fold_seeds(random_state, n_folds):
+    """
+    Function to derive an independent seed per fold from one seed, so the
+    result of a fold does not depend on which process runs it.
+
+    Returns
+    -------
+    seeds : list of n_folds integer seeds
+
+    """
+    sequence = np.random.SeedSequence(random_state)
+    return [int(child.generate_state(1)[0]) for child in sequence.spawn(n_folds)]
+
+
+def fold_data(X, label, index_train, index_test):
+    """
+    Function to prepare the train- and testset of one fold: imputation,
+    scaling and parameter selection, fit on the trainset only.
+
+    Returns
+    -------
+    train, test : train- and testset after preprocessing
+    train_label, test_label : labels of train- and testset
+    features_select : DataFrame containing the selected parameters
+    pipeline : preprocessing pipeline fit on the trainset
+
+    """
+    train = X.iloc[index_train]
+    train_label = label[index_train]
+    test = X.iloc[index_test]
+    test_label = label[index_test]
+    
+    # Imputation, scaling and parameter selection fit on the trainset, the
+    # testset is transformed based on the trainset
+    pipeline = preprocessing_pipeline()
+    train = pipeline.fit_transform(train, train_label)
+    test = pipeline.transform(test)
+    features_select = selected_features(pipeline, X.columns)
+    
+    return train, test, train_label, test_label, features_select, pipeline
+
+
+def cv_fold(X, label, index_train, index_test, random_state, budget,
+            search='randomized'):
+    """
+    Function to run one fold of the cross validation: imputation, scaling,
+    parameter selection and Random Forest optimalization. Runs in a worker process.
+
+    Parameters
+    ----------
+    X : DataFrame containing parameters of all patients
+    label : array containing labels of all patients
+    index_train : rows of the trainset
+    index_test : rows of the testset
+    random_state : seed of the Random Forest optimalization
+    budget : division of the cores, see parallel.core_budget
+    search : search mode of random_forest_opt
+
+    Returns
+    -------
+    rfmodel : optimalised Random Forest classifier
+    test : testset after preprocessing
+    test_label : labels of testset
+    score_test, sens_test, spec_test : accuracy, sensitivity and specificity
+    features_select : DataFrame containing parameters and their importance
+    report : time per rung of successive halving, None for the other search
+        modes
+
+    """
+    # Limit BLAS threads of numpy in this worker
+    with threadpool_limits(limits=budget['blas'], user_api='blas'):
+        train, test, train_label, test_label, features_select, _ = fold_data(X, label,
+                                                                             index_train,
+                                                                             index_test)
+        
+        # Random Forest optimalization
+        rfmodel, score_test, sens_test, spec_test, features_select, report = random_forest_opt(train, test, 
+                                                                                                 train_label, test_label,
+                                                                                                 features_select,
+                                                                                                 random_state,
+                                                                                                 budget['search'],
+                                                                                                 budget['trees'],
+                                                                                                 search)
+    
+    return rfmodel, test, test_label, score_test, sens_test, spec_test, features_select, report
+
+
+def rf_cv(features, budget=None, random_state=0, search='randomized'):
+    """
+    Function for the 5-fold cross validation of the Random Forest model. The
+    folds run in parallel in a process pool; the results are gathered in fold
+    order and the ROC curves are drawn in the main process.
+
+    Parameters
+    ----------
+    features : DataFrame containing parameters and column 'Label'
+    budget : division of the cores over folds, search and trees (see
+        parallel.core_budget), None to use all cores. With budget['folds']
+        equal to 1 the folds run one after another
+    random_state : seed from which the seed of every fold is derived
+    search : search mode of random_forest_opt, 'randomized', 'warm_start',
+        'oob' or 'halving'
+
+    Returns
+    -------
+    score, sens, spec : accuracy, sensitivity and specificity per fold
+    tprs : True positive rates per fold
+    aucs : AUC per fold
+    important_features : DataFrame containing importance of the parameters
+        per fold
+
+    """
+    # Label and parameters (X), without the patient ID as in export_model
+    X, label = parameters_labels(features)
      
     # Create empty DataFrames and figure
     score, sens, spec, tprs, aucs = [], [], [], [], []
@@ -33,25 +146,31 @@ def rf_cv(features):
         
     # 5-fold cross validation
     cv5_fold = model_selection.StratifiedKFold(n_splits=5) 
+    folds = list(cv5_fold.split(X, label))
+    seeds = fold_seeds(random_state, len(folds))
     
-    for index_train, index_test in cv5_fold.split(X,y):
-        label = np.array(y)
-        train = X.iloc[index_train]
-        train_label = label[index_train]
-        test = X.iloc[index_test]
-        test_label = label[index_test]
-        
-        # Imputation for train- and testset independently 
-        train = lab_imputation(train)
-        test = lab_imputation(test)
-        
-        # Parameter selection
-        train, test, features_select = selection(train, test, train_label)
+    if budget is None:
+        budget = core_budget(n_folds=len(folds), n_fits=search_fits(search))
+    
+    if budget['folds'] == 1:
+        results = [cv_fold(X, label, index_train, index_test, seed, budget, search)
+                   for (index_train, index_test), seed in zip(folds, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=budget['folds']) as pool:
+            futures = [pool.submit(cv_fold, X, label, index_train, index_test,
+                                   seed, budget, search)
+                       for (index_train, index_test), seed in zip(folds, seeds)]
+            # Results in fold order
+            results = [future.result() for future in futures]
+    
+    for fold, (rfmodel, test, test_label, score_test, sens_test, spec_test,
+               features_select, report) in enumerate(results):
+        # Time per rung of successive halving, printed here in fold order 
+        # instead of in the worker processes
+        if report is not None:
+            print('Successive halving, time per rung (fold %d):' % (fold + 1))
+            print(report)
         
-        # Random Forest optimalization
-        rfmodel, score_test, sens_test, spec_test, features_select = random_forest_opt(train, test, 
-                                                                                         train_label, test_label,
-                                                                                         features_select)                                                                               
         # Store scores
         score.append(score_test)
         sens.append(sens_test)
@@ -64,6 +183,40 @@ def rf_cv(features):
         # Save used features and importance  
         important_features = pd.merge(important_features, features_select, how="outer", on=["Specs"])
         
-    return score, sens, spec, tprs, aucs, important_features 
-        
+    return score, sens, spec, tprs, aucs, important_features
+
+
+def oob_cv_agreement(features, budget=None, random_state=0):
+    """
+    Function to compare the out-of-bag selection of n_estimators with the
+    inner-CV selection in every fold of the 5-fold cross validation, with the
+    same folds and seeds as rf_cv.
 
+    Returns
+    -------
+    agreement : DataFrame with per fold the selected number of trees of both
+        methods, whether they agree, the CV accuracy of both choices and the
+        mean absolute difference between CV and out-of-bag accuracy
+
+    """
+    X, label = parameters_labels(features)
+    
+    cv5_fold = model_selection.StratifiedKFold(n_splits=5)
+    folds = list(cv5_fold.split(X, label))
+    seeds = fold_seeds(random_state, len(folds))
+    if budget is None:
+        # The inner folds of the warm-start search run at the same time
+        budget = core_budget(n_folds=1, n_fits=search_fits('warm_start'))
+    
+    agreement = []
+    with threadpool_limits(limits=budget['blas'], user_api='blas'):
+        for (index_train, index_test), seed in zip(folds, seeds):
+            train, _, train_label, _, _, _ = fold_data(X, label, index_train,
+                                                       index_test)
+            _, summary = compare_oob_cv(train, train_label, seed, budget['search'],
+                                        budget['trees'])
+            agreement.append(summary)
+    
+    agreement = pd.DataFrame(agreement)
+    agreement.index.name = 'Fold'
+    return agreement
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Median of the vital parameters over windows of minute data, for arrays with
+one row per minute and one column per parameter. tumbling_median calculates
+the median of consecutive windows at once (the SIRS monitor and the feature
+state); grouped_median calculates the median of rows with the same group
+number, without a row per minute (median_per_10min); RollingMedian updates
+the median of a sliding window with every new minute. Missing values (NaN) are
+ignored, as in np.nanmedian.
+"""
+
+import collections
+import heapq
+import warnings
+import numpy as np
+
+
+def tumbling_median(values, width, axis=0):
+    """
+    Function to calculate the median of consecutive windows of width values
+    along axis, ignoring NaN values.
+
+    Parameters
+    ----------
+    values : array with a multiple of width values along axis
+    width : number of values per window, e.g. 10 minutes
+    axis : axis of the measurements in time
+
+    Returns
+    -------
+    medians : array with the same shape as values, except for axis which has
+        one value per window. Windows without any measurement are NaN
+
+    """
+    values = np.asarray(values, dtype=float)
+    axis = axis % values.ndim
+    length = values.shape[axis]
+    if length % width != 0:
+        raise ValueError('length of axis %d (%d) is not a multiple of width '
+                         '%d' % (axis, length, width))
+
+    shape = values.shape[:axis] + (length // width, width) + values.shape[axis+1:]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        medians = np.nanmedian(values.reshape(shape), axis=axis+1)
+
+    return medians
+
+
+def grouped_median(values, groups, n_groups):
+    """
+    Function to calculate the median of the rows of every group, ignoring NaN
+    values. The rows are sorted on group and value once per column, so the
+    memory is linear in the number of rows, also with many rows in one group.
+
+    Parameters
+    ----------
+    values : array (rows x columns)
+    groups : group number (0 to n_groups - 1) per row
+    n_groups : number of groups
+
+    Returns
+    -------
+    medians : array (n_groups x columns), groups without any value are NaN
+
+    """
+    values = np.asarray(values, dtype=float)
+    groups = np.asarray(groups, dtype=np.int64)
+    medians = np.full((n_groups, values.shape[1]), np.nan)
+    for column in range(values.shape[1]):
+        known = ~np.isnan(values[:, column])
+        group = groups[known]
+        value = values[known, column]
+        order = np.lexsort((value, group))
+        value = value[order]
+
+        # First row and number of values per group with values
+        counts = np.bincount(group, minlength=n_groups)
+        starts = np.cumsum(counts) - counts
+        filled = np.flatnonzero(counts)
+        low = starts[filled] + (counts[filled] - 1) // 2
+        high = starts[filled] + counts[filled] // 2
+        medians[filled, column] = (value[low] + value[high])/2
+    return medians
+
+
+class DualHeap:
+    """
+    Median of a changing set of values with a max-heap for the lower half and
+    a min-heap for the upper half. Removed values are only taken out of a heap
+    when they reach its top (lazy deletion), so adding and removing a value
+    takes O(log w) for w values.
+    """
+
+    def __init__(self):
+        # Lower half as negative values, upper half
+        self.low = []
+        self.high = []
+        # Values removed from the set but still in a heap
+        self.delayed = collections.Counter()
+        self.low_size = 0
+        self.high_size = 0
+
+    def __len__(self):
+        return self.low_size + self.high_size
+
+    def prune(self, heap, sign):
+        """Remove deleted values from the top of heap"""
+        while heap and self.delayed[sign*heap[0]] > 0:
+            self.delayed[sign*heap[0]] -= 1
+            heapq.heappop(heap)
+
+    def balance(self):
+        """Keep the lower half equal to or one larger than the upper half"""
+        if self.low_size > self.high_size + 1:
+            heapq.heappush(self.high, -heapq.heappop(self.low))
+            self.low_size -= 1
+            self.high_size += 1
+            self.prune(self.low, -1)
+        elif self.low_size < self.high_size:
+            heapq.heappush(self.low, -heapq.heappop(self.high))
+            self.low_size += 1
+            self.high_size -= 1
+            self.prune(self.high, 1)
+
+    def add(self, value):
+        if not self.low or value <= -self.low[0]:
+            heapq.heappush(self.low, -value)
+            self.low_size += 1
+        else:
+            heapq.heappush(self.high, value)
+            self.high_size += 1
+        self.balance()
+
+    def remove(self, value):
+        self.delayed[value] += 1
+        if value <= -self.low[0]:
+            self.low_size -= 1
+            if value == -self.low[0]:
+                self.prune(self.low, -1)
+        else:
+            self.high_size -= 1
+            if value == self.high[0]:
+                self.prune(self.high, 1)
+        self.balance()
+
+    def median(self):
+        if len(self) == 0:
+            return np.nan
+        if self.low_size > self.high_size:
+            return -self.low[0]
+        return (-self.low[0] + self.high[0])/2
+
+
+class RollingMedian:
+    """
+    Median per parameter of the last width measurements, updated with every
+    new measurement. A measurement with NaN values takes a place in the window
+    but is ignored in the median of those parameters.
+
+    Parameters
+    ----------
+    width : number of measurements in the window, e.g. 10 minutes
+    n_parameters : number of parameters per measurement
+    """
+
+    def __init__(self, width, n_parameters):
+        self.width = width
+        self.window = collections.deque()
+        self.heaps = [DualHeap() for _ in range(n_parameters)]
+
+    def __len__(self):
+        return len(self.window)
+
+    def push(self, values):
+        """
+        Function to add a measurement (one value per parameter) to the window,
+        the oldest measurement is removed from a full window.
+
+        Returns
+        -------
+        medians : array containing the median per parameter of the window
+
+        """
+        values = np.asarray(values, dtype=float)
+        if len(self.window) == self.width:
+            for heap, value in zip(self.heaps, self.window.popleft()):
+                if not np.isnan(value):
+                    heap.remove(value)
+        self.window.append(values)
+        for heap, value in zip(self.heaps, values):
+            if not np.isnan(value):
+                heap.add(value)
+        return self.median()
+
+    def median(self):
+        """Median per parameter of the window, NaN without any measurement"""
+        return np.array([heap.median() for heap in self.heaps])
+
+    def clear(self):
+        self.window.clear()
+        self.heaps = [DualHeap() for _ in self.heaps]
+
+
+def sliding_median(values, width):
+    """
+    Function to calculate the median of the last width rows for every row of
+    values, ignoring NaN values.
+
+    Parameters
+    ----------
+    values : array (measurements x parameters) in time order
+    width : number of rows per window
+
+    Returns
+    -------
+    medians : array (measurements x parameters), row i is the median of rows
+        i-width+1 up to and including i
+
+    """
+    values = np.asarray(values, dtype=float)
+    rolling = RollingMedian(width, values.shape[1])
+    medians = np.empty_like(values)
+    for i, row in enumerate(values):
+        medians[i] = rolling.push(row)
+    return medians
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Scoring of new PICU patients with a model saved by train_model.py. The
+laboratory and PDMS rows of the new patients are turned into the same
+features as in main_preprocessing (feature_table and vitals_postsurgery) and
+scored with the saved preprocessing pipeline and Random Forest, nothing is
+trained. Run as a script on extracts of the new patients, e.g.
+python score_patients.py --patients new_patients.csv --chemie new_chemie.csv
+    --hematologie new_hematologie.csv --bloedgas new_bloedgas.csv
+    --vitals new_pdms.csv
+"""
+
+# Import modules
+import argparse
+import time
+import pandas as pd
+
+# Created functions
+from ingest import extracts, read_extract, read_extract_chunks, type_extract
+from time_after_surgery import time_after_surgery
+from lab_features import feature_table
+from pdmsdata import vitals_admission, vitals_postsurgery
+from preprocess_pipeline import load_pipeline
+from train_model import model_path
+
+
+def load_model(path=model_path):
+    """Function to load a model saved by train_model.export_model"""
+    return load_pipeline(path)
+
+
+def patient_features(lab_chemie, lab_hematologie, lab_bloedgas, vitals,
+                     patient_information, hours):
+    """
+    Function to create the features of new patients at the moment of
+    prediction, as in main_preprocessing.
+
+    Parameters
+    ----------
+    lab_chemie, lab_hematologie, lab_bloedgas : DataFrames containing
+        laboratory rows of the patients (columns of the lab extracts)
+    vitals : DataFrame containing PDMS rows of the patients (columns of
+        ICKGsepsis.csv)
+    patient_information : DataFrame containing patient information
+    hours : hours after admission of the moment of prediction
+
+    Returns
+    -------
+    features : DataFrame containing the features per patient ID
+
+    """
+    # Laboratory features at moment of prediction (lab_features.py)
+    lab_chemie = time_after_surgery(lab_chemie, patient_information)
+    lab_hematologie = time_after_surgery(lab_hematologie, patient_information)
+    lab_bloedgas = time_after_surgery(lab_bloedgas, patient_information)
+    features_lab = feature_table(lab_chemie, lab_hematologie, lab_bloedgas,
+                                 patient_information, hours)
+    features_lab.reset_index(inplace=True)
+
+    # Vital parameters at moment of prediction (pdmsdata.py)
+    vitalsigns = vitals_admission(vitals, patient_information)
+    features_vitals = vitals_postsurgery(vitalsigns, hours)
+
+    # Keep data of patients that do have data in features_vitals
+    features_lab = features_lab.loc[features_lab['Patient ID'].isin(features_vitals['Patient ID'])]
+    features = pd.merge(features_lab, features_vitals, on='Patient ID', how='outer')
+
+    return features
+
+
+def feature_columns(features, columns):
+    """
+    Function to order the features as the columns the pipeline was trained
+    on, features that are missing are NaN. The names are unique, also for
+    features of more than one extract (lab_features.lab_columns).
+
+    Returns
+    -------
+    data : DataFrame with the given columns
+
+    """
+    if len(set(columns)) != len(columns):
+        raise ValueError('The model has duplicate feature names, retrain it '
+                         'with unique names: %s'
+                         % ', '.join(pd.Index(columns)[pd.Index(columns).duplicated()]))
+    return features.reindex(columns=columns)
+
+
+def patient_vitals(vitals, patient_information):
+    """
+    Function to load the PDMS data of the patients in patient_information.
+    The extract is read in chunks and only the rows of these patients are
+    kept, as in vitalsigns_pdms, so the whole extract is never in memory.
+
+    Parameters
+    ----------
+    vitals : name of .csv file with PDMS data (columns of ICKGsepsis.csv)
+    patient_information : DataFrame containing patient information
+
+    Returns
+    -------
+    vitals : DataFrame containing the PDMS data of the patients
+
+    """
+    chunks = [chunk.loc[chunk['Patient ID'].isin(patient_information['Patient ID'])]
+              for chunk in read_extract_chunks(vitals, 'pdms')]
+    if not chunks:
+        # Empty extract
+        return type_extract(pd.DataFrame(columns=extracts['pdms']['names']), 'pdms')
+    return pd.concat(chunks, ignore_index=True)
+
+
+def score_patients(artifact, features):
+    """
+    Function to score patients with a saved model.
+
+    Parameters
+    ----------
+    artifact : model loaded with load_model
+    features : DataFrame containing the features per patient ID, features
+        missing for a patient are imputed by the pipeline
+
+    Returns
+    -------
+    scores : DataFrame with per patient ID the probability of sepsis
+        ('Probability') and the predicted label ('Prediction', 0: SIRS,
+        1: sepsis)
+
+    """
+    model = artifact['model']
+    data = feature_columns(features, artifact['columns'])
+    data = artifact['pipeline'].transform(data)
+    probability = model.predict_proba(data)
+
+    scores = pd.DataFrame({'Patient ID': features['Patient ID'].to_numpy(),
+                           'Probability': probability[:, list(model.classes_).index(1)],
+                           'Prediction': model.classes_[probability.argmax(axis=1)]})
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Score new PICU patients with '
+                                     'a saved SIRS versus sepsis model')
+    parser.add_argument('--model', default=model_path)
+    # Extracts of the new patients, no defaults so the training cohort is not
+    # scored by accident
+    parser.add_argument('--patients', required=True)
+    parser.add_argument('--chemie', required=True)
+    parser.add_argument('--hematologie', required=True)
+    parser.add_argument('--bloedgas', required=True)
+    parser.add_argument('--vitals', required=True)
+    parser.add_argument('--output', default='scores.csv')
+    args = parser.parse_args()
+
+    artifact = load_model(args.model)
+
+    # Patients with CPB and their laboratory and PDMS rows
+    patient_information = read_extract(args.patients, 'patients')
+    patient_information = patient_information.loc[patient_information['CPB'] == 1]
+    patient_information.reset_index(drop=True, inplace=True)
+    lab_chemie = read_extract(args.chemie, 'lab')
+    lab_hematologie = read_extract(args.hematologie, 'lab')
+    lab_bloedgas = read_extract(args.bloedgas, 'lab')
+    vitals = patient_vitals(args.vitals, patient_information)
+
+    start = time.perf_counter()
+    features = patient_features(lab_chemie, lab_hematologie, lab_bloedgas, vitals,
+                                patient_information, artifact['hours'])
+    scores = score_patients(artifact, features)
+    seconds = time.perf_counter() - start
+
+    scores.to_csv(args.output, sep=';', index=False)
+    print('%d patients scored in %.3f s: %.1f patients/s, %.2f ms per patient'
+          % (len(scores), seconds, len(scores)/seconds, 1000*seconds/max(len(scores), 1)))
+
+
+if __name__ == '__main__':
+    main()
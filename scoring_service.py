@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Local scoring service that keeps a model saved by train_model.py in memory.
+Clients connect over TCP or a Unix socket and send one JSON object per line
+with the raw rows of a micro-batch of patients:
+
+    {"patients": [...], "lab_chemie": [...], "lab_hematologie": [...],
+     "lab_bloedgas": [...], "vitals": [...]}
+
+Every row is an object with the columns of the extract (patients.csv, the lab
+extracts and ICKGsepsis.csv, with the same date formats). The features are
+built with the functions of score_patients.py and the service answers with one
+JSON object per line: {"scores": [{"Patient ID": ..., "Probability": ...,
+"Prediction": ...}, ...]} or {"error": "..."}.
+Run as a script, e.g. python scoring_service.py --port 8765
+"""
+
+# Import modules
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+# Created functions
+from ingest import extracts, type_extract
+from score_patients import load_model, patient_features, score_patients
+from train_model import model_path
+
+# Keys of a request per extract layout (ingest.py)
+request_tables = {'patients': 'patients', 'lab_chemie': 'lab',
+                  'lab_hematologie': 'lab', 'lab_bloedgas': 'lab',
+                  'vitals': 'pdms'}
+
+
+def request_frame(rows, kind):
+    """
+    Function to convert the rows of a request to a typed DataFrame with the
+    columns of an extract, columns missing in the rows are empty.
+
+    Parameters
+    ----------
+    rows : list of dicts, one per row
+    kind : layout of the extract, key of ingest.extracts
+
+    Returns
+    -------
+    dataframe : DataFrame as returned by ingest.read_extract
+
+    """
+    dataframe = pd.DataFrame.from_records(rows, columns=extracts[kind]['names'])
+    return type_extract(dataframe, kind)
+
+
+class ScoringService:
+    """
+    Scoring service with the model in memory. Requests are scored one after
+    another in a worker thread, so the event loop keeps accepting connections.
+
+    Parameters
+    ----------
+    artifact : model loaded with score_patients.load_model
+    """
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def score(self, request):
+        """
+        Function to score one request.
+
+        Returns
+        -------
+        response : dict with the scores per patient
+
+        """
+        tables = {key: request_frame(request.get(key, []), kind)
+                  for key, kind in request_tables.items()}
+
+        # Patients with CPB, as in vitalsigns_pdms
+        patient_information = tables['patients']
+        patient_information = patient_information.loc[patient_information['CPB'] == 1]
+        patient_information = patient_information.reset_index(drop=True)
+
+        features = patient_features(tables['lab_chemie'], tables['lab_hematologie'],
+                                    tables['lab_bloedgas'], tables['vitals'],
+                                    patient_information, self.artifact['hours'])
+        scores = score_patients(self.artifact, features)
+
+        return {'scores': json.loads(scores.to_json(orient='records'))}
+
+    async def handle(self, reader, writer):
+        """Answer every line (request) of a connection with one line"""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    response = await loop.run_in_executor(self.executor,
+                                                          self.score, request)
+                except Exception as error:
+                    response = {'error': '%s: %s' % (type(error).__name__, error)}
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, path=None):
+        """
+        Function to run the service until it is cancelled.
+
+        Parameters
+        ----------
+        host, port : address to listen on with TCP
+        path : name of a Unix socket to listen on instead of TCP
+
+        """
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=path,
+                                                     limit=2**26)
+        else:
+            server = await asyncio.start_server(self.handle, host, port,
+                                                limit=2**26)
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local SIRS versus sepsis '
+                                     'scoring service')
+    parser.add_argument('--model', default=model_path)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', default=None,
+                        help='Unix socket to listen on instead of TCP')
+    args = parser.parse_args()
+
+    service = ScoringService(load_model(args.model))
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -29,7 +29,7 @@ def selection(data_train, data_test, labels_train):
     """  
     
     # Univariate feature selection based on train data
-    fselect = SelectPercentile(f_classif, 90)
+    fselect = SelectPercentile(f_classif, percentile=90)
     fselect.fit(data_train, labels_train)
 
     # Names of features that are selected
@@ -0,0 +1,318 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Incremental SIRS monitor for streams of vital parameters (PDMS) and
+leukocytes (laboratory). The monitor keeps per patient the measurements of the
+current 10 minutes and the last leukocyte value, and scores the SIRS criteria
+(SIRScriteria.py) every time 10 minutes are complete. The windows and the
+carry-forward of leukocytes are the same as in all_vitals and sirs_table, so
+replaying the data of the first 24 hours gives the same patients as
+sirs_criteria.
+"""
+
+import collections
+import numpy as np
+import pandas as pd
+
+# Created functions
+from SIRScriteria import sirs_flags, patient_age
+from time_after_surgery import admissiontable
+from pdmsdata import vitalsigns_pdms
+from ingest import read_extract
+from rolling_median import tumbling_median
+
+# 24 hours of 10 minutes
+n_windows = 144
+
+# State change of a patient: minute after admission at the end of the 10
+# minutes that changed the SIRS label, new label and whether the patient met
+# the SIRS criteria at least once
+SIRSEvent = collections.namedtuple('SIRSEvent', ['patient', 'minute', 'label',
+                                                 'sirs'])
+
+
+class PatientState:
+    """State of one patient in the SIRS monitor"""
+
+    def __init__(self, admission, age):
+        self.admission = admission
+        # Age at admission in days
+        self.age = age
+        # Window (10 minutes) with measurements that is not scored yet
+        self.window = None
+        # Measurements of this window: HR, RR, Temp rect per row (all rows
+        # count in the median, also rows with the same minute, as in
+        # median_per_10min)
+        self.rows = []
+        # First window that is not scored yet
+        self.next_window = 0
+        self.leuko = np.nan
+        self.has_leuko = False
+        self.has_vitals = False
+        # SIRS label of the last scored window and of the last event
+        self.label = False
+        self.emitted = False
+        # Patient met SIRS criteria in at least one window
+        self.sirs = False
+
+    @property
+    def included(self):
+        """Patient is scored in sirs_criteria: vitals, leukocytes and age"""
+        return self.has_vitals and self.has_leuko and not np.isnan(self.age)
+
+
+class SIRSMonitor:
+    """
+    Incremental SIRS monitor. Measurements are given in time order with vital,
+    leuko and flush; every call returns the state changes (SIRSEvent) it
+    caused. The cost per measurement does not depend on the amount of data
+    seen before.
+
+    Parameters
+    ----------
+    admission : Series containing date of admission with patient ID as index
+    age : Series containing age at admission (timedelta or days) with patient
+        ID as index
+    """
+
+    def __init__(self, admission, age):
+        if pd.api.types.is_timedelta64_dtype(age):
+            age = age / pd.Timedelta(days=1)
+        age = age.reindex(admission.index)
+        self.patients = {ptid: PatientState(admitted, days)
+                         for ptid, admitted, days in zip(admission.index,
+                                                         admission, age)}
+
+    @classmethod
+    def from_patient_information(cls, patient_information):
+        """SIRS monitor for the patients in patient_information"""
+        return cls(admissiontable(patient_information),
+                   patient_age(patient_information))
+
+    def vital(self, ptid, time, hr, rr, temp):
+        """
+        Add a measurement of the vital parameters (one minute of PDMS data).
+
+        Parameters
+        ----------
+        ptid : patient ID
+        time : date and time of measurement
+        hr, rr, temp : heart rate, respiratory rate and rectal temperature
+
+        Returns
+        -------
+        events : list of SIRSEvent
+
+        """
+        state = self.patients.get(ptid)
+        if state is None:
+            return []
+
+        # Only data between 1 and 24 hours after admission (all_vitals)
+        difference = pd.Timestamp(time) - state.admission
+        if not 1 < difference / pd.Timedelta(hours=1) < 24:
+            return []
+        window = difference // pd.Timedelta(minutes=1) // 10
+        if window < state.next_window:
+            # Window was already scored
+            return []
+
+        # Windows before this window are complete
+        events = self.score(ptid, state, window)
+        if state.window != window:
+            state.window = window
+            state.rows = []
+        state.rows.append((hr, rr, temp))
+        state.has_vitals = True
+
+        return events
+
+    def leuko(self, ptid, time, value):
+        """
+        Add a leukocyte measurement.
+
+        Parameters
+        ----------
+        ptid : patient ID
+        time : date and time of measurement
+        value : leukocytes
+
+        Returns
+        -------
+        events : list of SIRSEvent
+
+        """
+        state = self.patients.get(ptid)
+        if state is None:
+            return []
+
+        # Only measurements during admission in the first 24 hours
+        # (time_after_surgery.py and sirs_table)
+        difference = pd.Timestamp(time) - state.admission
+        hours = difference // pd.Timedelta(microseconds=1)/10**6/3600
+        if not 0 < hours < 24:
+            return []
+
+        # Windows ending at or before the measurement use the previous value
+        minutes = hours*60
+        events = self.score(ptid, state, int(minutes // 10))
+        state.leuko = value
+        state.has_leuko = True
+
+        return events
+
+    def flush(self, ptid=None):
+        """
+        Score all remaining windows of the first 24 hours, for one patient or
+        for all patients.
+
+        Returns
+        -------
+        events : list of SIRSEvent
+
+        """
+        ptids = self.patients if ptid is None else [ptid]
+        events = []
+        for i in ptids:
+            events += self.score(i, self.patients[i], n_windows)
+        return events
+
+    def score(self, ptid, state, until):
+        """
+        Score the SIRS criteria of all windows before window until. Windows
+        without vital parameters are scored at once, as their label only
+        depends on the last leukocyte value.
+        """
+        events = []
+        until = min(until, n_windows)
+        while state.next_window < until:
+            window = state.next_window
+            if window == state.window:
+                # Median per parameter of the 10 minutes
+                hr, rr, temp = tumbling_median(np.array(state.rows),
+                                               len(state.rows))[0]
+                state.window = None
+                state.next_window = window + 1
+            else:
+                hr = rr = temp = np.nan
+                stop = until
+                if state.window is not None and window < state.window < until:
+                    stop = state.window
+                state.next_window = stop
+
+            flags = sirs_flags(state.age, temp, state.leuko, hr, rr)
+            state.label = bool(flags['Leuko'] or flags['Temp rect'])
+            state.sirs = state.sirs or state.label
+            events += self.emit(ptid, state, (window + 1)*10)
+
+        return events
+
+    def emit(self, ptid, state, minute):
+        """State change of an included patient"""
+        if not state.included or state.label == state.emitted:
+            return []
+        state.emitted = state.label
+        return [SIRSEvent(ptid, minute, state.label, state.sirs)]
+
+    def verdicts(self):
+        """
+        Patients that are scored and whether they met the SIRS criteria in at
+        least one window so far.
+
+        Returns
+        -------
+        verdicts : DataFrame with columns 'Patient ID' and 'SIRS'
+
+        """
+        verdicts = [(ptid, state.sirs) for ptid, state in self.patients.items()
+                    if state.included]
+        verdicts = pd.DataFrame(verdicts, columns=['Patient ID', 'SIRS'])
+        return verdicts
+
+
+def replay_stream(vitalsigns, lab_hematologie):
+    """
+    Function to put the vital parameters and leukocytes in one DataFrame in
+    time order, with column 'Kind' 0 for vitals and 1 for leukocytes (value
+    in column 'HR').
+
+    Returns
+    -------
+    stream : DataFrame with columns 'Patient ID', 'Time', 'Kind', 'HR', 'RR'
+        and 'Temp rect'
+
+    """
+    vitals = pd.DataFrame({'Patient ID': vitalsigns['Patient ID'],
+                           'Time': vitalsigns['Datetime'],
+                           'Kind': 0,
+                           'HR': vitalsigns['HR'],
+                           'RR': vitalsigns['RR'],
+                           'Temp rect': vitalsigns['Temp rect']})
+    leuko = lab_hematologie.loc[lab_hematologie['Measurement'] == 'Leukocyten']
+    leuko = pd.DataFrame({'Patient ID': leuko['Patient ID'],
+                          'Time': leuko['Time'],
+                          'Kind': 1,
+                          'HR': leuko['Value']})
+    stream = pd.concat([vitals, leuko], ignore_index=True)
+    stream = stream.sort_values('Time', kind='mergesort')
+    return stream
+
+
+def replay(monitor, vitalsigns, lab_hematologie):
+    """
+    Function to give PDMS and laboratory data to a SIRS monitor in time order,
+    as if the measurements arrive at the bedside.
+
+    Parameters
+    ----------
+    monitor : SIRSMonitor
+    vitalsigns : DataFrame containing vital parameters per patient
+        (vitalsigns_pdms in pdmsdata.py)
+    lab_hematologie : DataFrame containing laboratory parameters (hematology)
+        per patient, including time of measurement
+
+    Yields
+    ------
+    event : SIRSEvent for every state change
+
+    """
+    stream = replay_stream(vitalsigns, lab_hematologie)
+    for ptid, time, kind, hr, rr, temp in stream.itertuples(index=False):
+        if kind == 0:
+            events = monitor.vital(ptid, time, float(hr), float(rr), float(temp))
+        else:
+            events = monitor.leuko(ptid, time, float(hr))
+        yield from events
+
+    yield from monitor.flush()
+
+
+def replay_extracts(vitals, lab_hematologie, patient_information):
+    """
+    Function to replay the PDMS and hematology extracts through a SIRS
+    monitor.
+
+    Parameters
+    ----------
+    vitals : name of .csv file, 'ICKGsepsis.csv'
+    lab_hematologie : name of .csv file, 'Lab_Hematologie.csv'
+    patient_information : .csv file containing patient information,
+        'patients.csv'
+
+    Returns
+    -------
+    events : list of SIRSEvent in the order they were emitted
+    verdicts : DataFrame with columns 'Patient ID' and 'SIRS'
+
+    """
+    vitalsigns, patient_information = vitalsigns_pdms(vitals,
+                                                      patient_information)
+    lab_hematologie = read_extract(lab_hematologie, 'lab')
+
+    monitor = SIRSMonitor.from_patient_information(patient_information)
+    events = list(replay(monitor, vitalsigns, lab_hematologie))
+
+    return events, monitor.verdicts()
@@ -5,8 +5,30 @@ Author: Marit Verboom
 Date: 02/2022 - 05/22
 """
 
-from datetime import datetime
 import numpy as np 
+import pandas as pd
+
+# Format of the timestamps in the laboratory extracts and patients.csv
+date_format_str = '%Y-%m-%d %H:%M:%S.%f'
+
+
+def parse_datetime(column, date_format=date_format_str):
+    """
+    Function to convert a column with timestamps to datetime64 format. Columns
+    that are already in datetime64 format are returned unchanged, so the
+    timestamps are only parsed once.
+
+    Parameters
+    ----------
+    column : Series containing timestamps (strings or datetime64)
+    date_format : format of the timestamps if these are strings
+
+    Returns
+    -------
+    column : Series containing timestamps in datetime64 format
+
+    """
+    return pd.to_datetime(column, format=date_format)
 
 
 def selectpatients(dataframe, patient_information):
@@ -29,15 +51,48 @@ def selectpatients(dataframe, patient_information):
     dataframe = dataframe
     patient_id = patient_information
     
-    # Find rows where patient ID is in patient_information Dataframe
+    # Find rows where patient ID is in patient_information Dataframe, as a
+    # new DataFrame (not a view), so columns can be added without copies
     dataframekeep = dataframe['Patient ID'].isin(patient_id['Patient ID'])      
-    dataframekeep = dataframe[dataframekeep]                                    
-    dataframekeep.reset_index(drop=True, inplace=True)                         
+    dataframekeep = dataframe.loc[dataframekeep].reset_index(drop=True)
     return dataframekeep
             
           
 
-def admissiondate(dataframe, patient_information):
+def admissiontable(patient_information, keep='last'):
+    """
+    Function to create a table with one date of admission per patient ID. 
+    Patients can be admitted to the PICU more than once, so patient_information
+    can contain several rows per patient ID.
+
+    Parameters
+    ----------
+    patient_information : Dataframe containing patient ID and date of admission.
+    keep : admission that is used for patients with several admissions, 'last'
+        (most recent admission) or 'first' (earliest admission).
+
+    Returns
+    -------
+    admission : Series containing date of admission (datetime64) with patient
+        ID as index
+
+    """
+    if keep not in ('first', 'last'):
+        raise ValueError("keep should be 'first' or 'last', not %r" % (keep,))
+    
+    admission = patient_information[['Patient ID', 'Admissiondate']].copy()
+    admission['Admissiondate'] = parse_datetime(admission['Admissiondate'])
+    
+    # Sort admissions per patient in time and keep one admission per patient
+    admission = admission.sort_values(['Patient ID', 'Admissiondate'],
+                                      kind='mergesort')
+    admission = admission.drop_duplicates('Patient ID', keep=keep)
+    admission = admission.set_index('Patient ID')['Admissiondate']
+    
+    return admission
+
+
+def admissiondate(dataframe, patient_information, keep='last'):
     """
     Function to add date of admission to a dataframe (derived from 
                                                       patient_information)
@@ -47,24 +102,20 @@ def admissiondate(dataframe, patient_information):
     dataframe : DataFrame containing parameter values per patient ID, 
         including time of measurement.
     patient_information : Dataframe containing patient ID and date of admission.
+    keep : admission that is used for patients with several admissions, 'last'
+        (most recent admission) or 'first' (earliest admission).
 
     Returns
     -------
-    dataframe : DataFrame with added column 'Opnamedatum'
+    dataframe : DataFrame with added column 'Admissiondate' (datetime64)
 
     """
-    # Create new column for date of admittance to the PICU
-    dataframe = dataframe
-    dataframe['Admissiondate'] = ''                                             
-    patient_information = patient_information
-    count = 0
-
-    # Add date of admission from patient_information to dataframe per patient ID
-    for i in patient_information['Patient ID']:
-        index = np.where(dataframe['Patient ID'] == i)
-        for x in index:
-            dataframe['Admissiondate'][x] = patient_information['Admissiondate'][count]
-        count = count + 1
+    # One date of admission per patient ID
+    admission = admissiontable(patient_information, keep)
+    
+    # Add date of admission to dataframe per patient ID (hash join on 
+    # patient ID, patients without admission get NaT)
+    dataframe['Admissiondate'] = dataframe['Patient ID'].map(admission)
         
     return dataframe
 
@@ -85,14 +136,33 @@ def duringadmission(dataframe):
     """
     
     # Keep where time of measurement is after date of admission
-    keep = np.where(dataframe['Time'] > dataframe['Admissiondate'])[0]         
-    keep = dataframe.index.isin(keep)
-    dataframe = dataframe[keep]
-    dataframe.reset_index(drop=True, inplace=True)
+    dataframe['Time'] = parse_datetime(dataframe['Time'])
+    keep = (dataframe['Time'] > dataframe['Admissiondate']).to_numpy()
+    dataframe = dataframe.loc[keep].reset_index(drop=True)
     
     return dataframe
 
 
+def hours_after_admission(dataframe):
+    """
+    Function to calculate the time of measurement after admission in hours,
+    in float64 from the difference in whole microseconds (same rounding as 
+    timedelta.total_seconds()/3600).
+
+    Parameters
+    ----------
+    dataframe : DataFrame with columns 'Time' and 'Admissiondate' (datetime64)
+
+    Returns
+    -------
+    hours : float64 array with the time after admission in hours
+
+    """
+    diff = dataframe['Time'] - dataframe['Admissiondate']
+    diffmicro = diff // pd.Timedelta(microseconds=1)
+    return (diffmicro/10**6/3600).to_numpy(dtype=np.float64)
+
+
 def timeaftersurgery(dataframe):
     """
     Function that calculates the time after surgery based on timestamps from 
@@ -106,18 +176,18 @@ def timeaftersurgery(dataframe):
     Returns
     -------
     dataframe: Same as input parameter, with added column 'Difference' 
-        containing the time of measurement after admittance to the PICU in hours.
+        containing the time of measurement after admittance to the PICU in 
+        hours (float32).
     """
     
-    date_format_str = '%Y-%m-%d %H:%M:%S.%f'
-    dataframe['Difference'] = ''
-
-    for i in range(len(dataframe)):
-        start = datetime.strptime(dataframe['Admissiondate'][i], date_format_str) # Starttime: date and time of admission
-        end = datetime.strptime(dataframe['Time'][i], date_format_str)            # Endtime: date and time of measurement
-        diff = end-start                                                          # Difference between start- and endtime
-        diffhours = diff.total_seconds()/3600                                     # Convert to hours
-        dataframe['Difference'][i] = diffhours                                    # Add to DataFrame 
+    # Parse time of measurement and date of admission once for all rows
+    dataframe['Time'] = parse_datetime(dataframe['Time'])
+    dataframe['Admissiondate'] = parse_datetime(dataframe['Admissiondate'])
+    
+    # Hours after admission, stored as float32 (resolution of a few 
+    # milliseconds in the first days). Use hours_after_admission where exact 
+    # boundaries matter.
+    dataframe['Difference'] = hours_after_admission(dataframe).astype(np.float32)
     return dataframe
 
 
@@ -136,7 +206,9 @@ def time_after_surgery(dataframe, patient_information):
     -------
     data: DataFrame containing parametervalues per patient ID of measurements
         during PICU stay, including time of measurement after admittance to the
-        PICU in hours.
+        PICU in hours. The columns keep the types of ingest.py (int32 patient 
+        ID, categorical measurement, float32 value, datetime64 time) and 
+        'Difference' is float32.
     """
     
     # Rename input variables
@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+"""
+
+import numpy as np
+import pandas as pd
+
+# Created functions
+from time_after_surgery import hours_after_admission
+
+
+def window_sides(closed):
+    """Sides for np.searchsorted of the start and end of a window"""
+    if closed not in ('left', 'right', 'both', 'neither'):
+        raise ValueError("closed should be 'left', 'right', 'both' or "
+                         "'neither', not %r" % (closed,))
+    start_side = 'left' if closed in ('left', 'both') else 'right'
+    end_side = 'right' if closed in ('right', 'both') else 'left'
+    return start_side, end_side
+
+
+class TimeIndex:
+    """
+    Index on the time of measurement after admission per patient. The data is
+    sorted once on patient ID and time after admission, after which a window
+    of hours after admission is found with one binary search for all patients
+    instead of a scan of the entire DataFrame.
+
+    Parameters
+    ----------
+    dataframe : DataFrame containing parameter values per patient ID
+    hours : time of measurement after admission per row of dataframe, in hours
+        or as timedelta
+    """
+
+    def __init__(self, dataframe, hours):
+        hours = pd.Series(hours)
+        if pd.api.types.is_timedelta64_dtype(hours):
+            hours = hours / pd.Timedelta(hours=1)
+        hours = hours.to_numpy(dtype=np.float64)
+        patient = dataframe['Patient ID'].to_numpy()
+
+        # Sort on patient ID and time after admission
+        order = np.lexsort((hours, patient))
+        self.data = dataframe.iloc[order].reset_index(drop=True)
+        self.hours = hours[order]
+
+        # First and last row (exclusive) of every patient
+        self.patients, self.starts, number = np.unique(patient[order],
+                                                       return_index=True,
+                                                       return_inverse=True)
+        self.ends = np.append(self.starts[1:], len(order))
+
+        # Sorted key of patient and time: patient number times (number of
+        # distinct times + 1) plus the rank of the time, so the rows of all
+        # patients are found with one search on this key
+        self.times = np.unique(self.hours)
+        self.stride = len(self.times) + 1
+        self.key = (number.astype(np.int64)*self.stride
+                    + np.searchsorted(self.times, self.hours))
+
+    def __len__(self):
+        return len(self.data)
+
+    def bounds(self, start, end, closed='left'):
+        """
+        Function to find the rows of every patient between start and end
+        hours after admission.
+
+        Parameters
+        ----------
+        start : start of window in hours after admission
+        end : end of window in hours after admission
+        closed : which side of the window is closed, 'left' for
+            [start, end), 'right', 'both' or 'neither'
+
+        Returns
+        -------
+        first : first row of the window per patient
+        last : last row of the window (exclusive) per patient
+
+        """
+        start_side, end_side = window_sides(closed)
+        first = self.search(start, start_side)
+        last = self.search(end, end_side)
+        last = np.maximum(first, last)
+
+        return first, last
+
+    def search(self, hours, side):
+        """
+        Function to find per patient the first row after hours (side 'left':
+        hours after admission >= hours, 'right': > hours), as np.searchsorted
+        on the rows of every patient.
+        """
+        rank = np.searchsorted(self.times, hours, side=side)
+        base = np.arange(len(self.patients), dtype=np.int64)*self.stride
+        return np.searchsorted(self.key, base + rank, side='left')
+
+    def window(self, start, end, closed='left'):
+        """
+        Function to select the data of all patients between start and end
+        hours after admission, see bounds.
+
+        Returns
+        -------
+        dataframe : DataFrame containing the rows in the window, sorted on
+            patient ID and time after admission
+
+        """
+        first, last = self.bounds(start, end, closed)
+        length = last - first
+
+        # Row numbers of all windows after each other
+        offset = np.repeat(first - np.cumsum(length) + length, length)
+        rows = offset + np.arange(length.sum())
+
+        return self.data.iloc[rows].reset_index(drop=True)
+
+    def patient(self, ptid, start=-np.inf, end=np.inf, closed='left'):
+        """
+        Function to select the data of one patient between start and end
+        hours after admission.
+
+        Returns
+        -------
+        dataframe : DataFrame containing the rows of the patient in the window
+
+        """
+        i = np.searchsorted(self.patients, ptid)
+        if i == len(self.patients) or self.patients[i] != ptid:
+            return self.data.iloc[:0]
+
+        lo, hi = self.starts[i], self.ends[i]
+        start_side, end_side = window_sides(closed)
+        first = lo + np.searchsorted(self.hours[lo:hi], start, side=start_side)
+        last = lo + np.searchsorted(self.hours[lo:hi], end, side=end_side)
+
+        return self.data.iloc[first:max(first, last)]
+
+
+def window_hours(dataframe, column='Difference'):
+    """
+    Function to get the time after admission in hours that windows are
+    selected on. For 'Difference' (float32, see time_after_surgery.py) the
+    exact hours are computed from 'Time' and 'Admissiondate' if the DataFrame
+    has these columns, so windows have the same boundaries as SIRScriteria.py.
+
+    Parameters
+    ----------
+    dataframe : DataFrame
+    column : column with the time of measurement after admission
+
+    Returns
+    -------
+    hours : time of measurement after admission per row
+
+    """
+    if column == 'Difference' and {'Time', 'Admissiondate'} <= set(dataframe.columns):
+        return hours_after_admission(dataframe)
+    return dataframe[column]
+
+
+def as_timeindex(dataframe, column='Difference'):
+    """
+    Function to create a TimeIndex on a column with the time after admission
+    (see window_hours), a TimeIndex is returned unchanged.
+
+    Parameters
+    ----------
+    dataframe : DataFrame or TimeIndex
+    column : column with the time of measurement after admission
+
+    Returns
+    -------
+    index : TimeIndex
+
+    """
+    if isinstance(dataframe, TimeIndex):
+        return dataframe
+    return TimeIndex(dataframe, window_hours(dataframe, column))
+
+
+def select_window(dataframe, start, end, closed='left', column='Difference'):
+    """
+    Function to select the rows between start and end hours after admission,
+    using the index if dataframe is a TimeIndex and a boolean mask on column
+    (see window_hours) otherwise.
+
+    Parameters
+    ----------
+    dataframe : DataFrame or TimeIndex
+    start : start of window in hours after admission
+    end : end of window in hours after admission
+    closed : which side of the window is closed, 'left', 'right', 'both' or
+        'neither'
+    column : column with the time of measurement after admission in hours
+
+    Returns
+    -------
+    dataframe : DataFrame containing the rows in the window
+
+    """
+    if isinstance(dataframe, TimeIndex):
+        return dataframe.window(start, end, closed)
+
+    window_sides(closed)
+    hours = window_hours(dataframe, column)
+    after = hours >= start if closed in ('left', 'both') else hours > start
+    before = hours <= end if closed in ('right', 'both') else hours < end
+    return dataframe.loc[after & before]
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+TM2.4 SIRS versus Sepsis
+Author: Marit Verboom
+Date: 02/2022 - 05/22
+
+Training of the final model on all patients: the preprocessing pipeline and
+the optimalised Random Forest are saved together in one file, which is used
+by score_patients.py to score new patients without training. Run as a script
+to train on the cohort and save the model, e.g. python train_model.py
+"""
+
+# Import modules
+import pandas as pd
+from threadpoolctl import threadpool_limits
+
+# Created functions
+from main_preprocessing import main_preprocessing
+from preprocess_pipeline import (preprocessing_pipeline, selected_features,
+                                 save_pipeline, parameters_labels)
+from random_forest_opt import optimise_forest, search_fits
+from parallel import core_budget, budget_report
+
+# Name of the saved model
+model_path = 'sirs_sepsis_model.joblib'
+
+
+def export_model(features, path, hours, budget=None, random_state=0,
+                 search='warm_start'):
+    """
+    Function to train the preprocessing pipeline and Random Forest on all
+    patients and save them in one file.
+
+    Parameters
+    ----------
+    features : DataFrame containing parameters per patient ID and column
+        'Label' (main_preprocessing)
+    path : name of the file to save the model to
+    hours : hours after admission of the moment of prediction of features
+    budget : division of the cores (parallel.core_budget), None for all cores
+    random_state : seed of the Random Forest optimalization
+    search : search mode of random_forest_opt
+
+    Returns
+    -------
+    artifact : dict with the fitted 'pipeline' and 'model', the feature
+        'columns' the pipeline expects, the 'hours' of the moment of
+        prediction and the 'features' kept by the parameter selection
+
+    """
+    # Label (y) and parameters (X), the patient ID is not a parameter
+    X, y = parameters_labels(features)
+
+    if budget is None:
+        budget = core_budget(n_folds=1, n_fits=search_fits(search))
+
+    with threadpool_limits(limits=budget['blas'], user_api='blas'):
+        pipeline = preprocessing_pipeline()
+        data = pipeline.fit_transform(X, y)
+        model, report = optimise_forest(data, y, random_state, budget['search'],
+                                        budget['trees'], search)
+    if report is not None:
+        print('Successive halving, time per rung:')
+        print(report)
+
+    artifact = {'pipeline': pipeline,
+                'model': model,
+                'columns': list(X.columns),
+                'hours': hours,
+                'features': selected_features(pipeline, X.columns)}
+    save_pipeline(artifact, path)
+
+    return artifact
+
+
+if __name__ == '__main__':
+    hours = 12
+
+    # Preprocessing
+    features_cleaned, patients_sirs, sirs_crit = main_preprocessing('patients.csv', hours)
+
+    # manually add labels based on EPD, 0: SIRS, 1: Sepsis
+    labels = pd.read_csv('labels.csv', sep = ';', names = ['Patient ID', 'Label'],
+                         index_col=False)
+    features_cleaned['Label'] = labels['Label']
+
+    search = 'warm_start'
+    budget = core_budget(n_folds=1, n_fits=search_fits(search))
+    print(budget_report(budget))
+    artifact = export_model(features_cleaned, model_path, hours, budget,
+                            search=search)
+    print('Model saved to %s: %d trees, %d features'
+          % (model_path, artifact['model'].n_estimators, len(artifact['features'])))